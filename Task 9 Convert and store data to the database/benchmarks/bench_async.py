@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.load_test import percentile
+
+PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent
+SERVERS = {
+    "wsgi": [sys.executable, "-c", "import sys; from werkzeug.serving import run_simple; from myapp.app import app; "
+                                   "run_simple('127.0.0.1', int(sys.argv[1]), app, threaded=True)"],
+    "asgi": [sys.executable, "-m", "myapp.asgi", "--port"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, directory):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=str(PROJECT_DIR))
+    process = subprocess.Popen(SERVERS[kind] + [str(port)], cwd=directory, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("{} server did not start".format(kind))
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed the connection")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+    return status, headers.get("connection", "").lower() != "close"
+
+
+async def client(port, paths, deadline, latencies, errors):
+    reader = writer = None
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write("GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n".format(path).encode())
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors.append(path)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+        if status >= 400:
+            errors.append(path)
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, paths, clients, seconds):
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(client(port, paths, deadline, latencies, errors) for _ in range(clients)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the WSGI and ASGI servers under many clients")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--path", action="append", default=[])
+    parser.add_argument("--server", action="append", choices=sorted(SERVERS), default=[])
+    args = parser.parse_args()
+    paths = args.path or ["/api/v1.0/report?format=json", "/api/v1.0/report/?order=desc&format=xml",
+                          "/api/v1.0/report/drivers?format=json&limit=10"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=str(PROJECT_DIR))
+        subprocess.run([sys.executable, "-m", "myapp.create_tables"], cwd=tmp, env=env, check=True,
+                       stderr=subprocess.DEVNULL)
+
+        print("{:>6} {:>8} {:>10} {:>8} {:>10} {:>10}".format("server", "clients", "requests", "errors", "req/s",
+                                                              "p99 ms"))
+        for kind in args.server or ["wsgi", "asgi"]:
+            process, port = start_server(kind, tmp)
+            try:
+                latencies, errors, elapsed = asyncio.run(load(port, paths, args.clients, args.seconds))
+            finally:
+                process.terminate()
+                process.wait()
+            p99 = percentile(latencies, 99) if len(latencies) > 1 else float("nan")
+            print("{:>6} {:>8} {:>10} {:>8} {:>10.0f} {:>10.1f}".format(kind, args.clients, len(latencies),
+                                                                          len(errors), len(latencies) / elapsed,
+                                                                          p99))
+
+
+if __name__ == "__main__":
+    main()
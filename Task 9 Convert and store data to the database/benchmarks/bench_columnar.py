@@ -0,0 +1,48 @@
+import argparse
+import time
+
+import numpy as np
+
+from myapp.columnar import ResultsTable
+
+
+def synthetic_table(laps, drivers_per_race):
+    rng = np.random.default_rng(2018)
+    races = max(1, laps // drivers_per_race)
+    race = np.repeat(np.arange(races, dtype=np.int32), drivers_per_race)[:laps]
+    driver = np.tile(np.arange(drivers_per_race, dtype=np.int32), races)[:laps]
+    car = driver % 10
+    start_ms = rng.integers(43200000, 43500000, laps, dtype=np.int64)
+    lap_ms = rng.integers(3000000, 3600000, laps, dtype=np.int64)
+    return ResultsTable(race, driver, car, start_ms, start_ms + lap_ms, lap_ms,
+                        np.array(["race-{}".format(i) for i in range(races)], dtype=object),
+                        np.array(["D{:05d}".format(i) for i in range(drivers_per_race)], dtype=object),
+                        np.array(["Driver {}".format(i) for i in range(drivers_per_race)], dtype=object),
+                        np.array(["TEAM {}".format(i) for i in range(10)], dtype=object))
+
+
+def timed(function):
+    started = time.perf_counter()
+    function()
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized analytics over the columnar results table")
+    parser.add_argument("--max", type=int, default=10000000)
+    parser.add_argument("--drivers", type=int, default=20, help="results per race")
+    args = parser.parse_args()
+
+    operations = [("sort", lambda table: table.order()), ("rank", lambda table: table.rank()),
+                  ("gap", lambda table: table.gap_to_leader()), ("teams", lambda table: table.team_summary())]
+    print("{:>10} ".format("laps") + " ".join("{:>10}".format(name + " ms") for name, _ in operations))
+    laps = 10000
+    while laps <= args.max:
+        table = synthetic_table(laps, args.drivers)
+        print("{:>10} ".format(laps) + " ".join("{:>10.2f}".format(timed(lambda: run(table)))
+                                                 for _, run in operations))
+        laps *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import pathlib
+import statistics
+import tempfile
+import time
+
+from peewee import SqliteDatabase
+
+import myapp.follow
+from myapp.create_tables import (Race, Driver, DatasetVersion, LogOffset, apply_load_pragmas, write_driver_rows,
+                                 bump_dataset_version)
+from myapp.follow import LogFollower, POLL_INTERVAL
+from myapp.ingest import ROW_FIELDS
+from myapp.snapshot import publish_snapshot
+from benchmarks.bench_ingest import abbreviations
+
+MODELS = (Race, Driver, DatasetVersion, LogOffset)
+
+
+def append(path, text):
+    with open(path, "a") as stream:
+        stream.write(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency from an end.log line being written to its row committed")
+    parser.add_argument("--drivers", type=int, default=2000)
+    parser.add_argument("--races", type=int, default=0,
+                        help="other stored races of as many drivers; with any, every poll also publishes the "
+                             "leaderboard snapshot file")
+    parser.add_argument("--lines", type=int, help="end.log lines to time (default: one per driver)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = pathlib.Path(tmp)
+        codes = abbreviations(args.drivers)
+        append(directory / "abbreviations.txt", "".join("{}_Driver {}_TEAM\n".format(abb, abb) for abb in codes))
+        append(directory / "start.log", "".join("{}2018-05-24_12:00:00.000\n".format(abb) for abb in codes))
+        (directory / "end.log").touch()
+
+        test_db = SqliteDatabase(str(directory / "follow.db"))
+        with test_db.bind_ctx(MODELS):
+            test_db.create_tables(MODELS)
+            apply_load_pragmas()
+            for number in range(args.races):
+                race = Race.create(name="race-{}".format(number), title="Race {}".format(number))
+                write_driver_rows([(race.id, abb, "Driver " + abb, "TEAM", 43200000, 46800000 + i, 3600000 + i)
+                                   for i, abb in enumerate(codes)], fields=ROW_FIELDS)
+            if args.races:
+                bump_dataset_version()
+                myapp.follow.SNAPSHOT_PATH = str(directory / "leaderboard.snapshot")
+            follower = LogFollower(Race.create(name="live", title="Live"), directory)
+            follower.poll()
+            if args.races:
+                publish_snapshot(myapp.follow.SNAPSHOT_PATH)
+
+            latencies = []
+            for i, abb in enumerate(codes[:args.lines]):
+                append(directory / "end.log", "{}2018-05-24_1:{:02d}:{:02d}.000\n".format(abb, i % 60, i * 7 % 60))
+                written = time.perf_counter()
+                assert follower.poll() == [abb]
+                latencies.append((time.perf_counter() - written) * 1000)
+
+    latencies.sort()
+    print("lines: {}  idle poll interval: {:.0f} ms".format(len(latencies), POLL_INTERVAL * 1000))
+    print("poll+commit ms  median {:.3f}  p99 {:.3f}  max {:.3f}".format(
+        statistics.median(latencies), latencies[int(len(latencies) * 0.99)], latencies[-1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent
+MODULES = ["myapp", "myapp.report", "myapp.create_tables", "myapp.ingest", "myapp.follow", "myapp.app"]
+
+
+def import_times(module):
+    # microseconds per module from -X importtime: {name: (self, cumulative)}, in a fresh interpreter
+    env = dict(os.environ, PYTHONPATH=str(PROJECT_DIR))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module], env=env, cwd=PROJECT_DIR,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup cost of the myapp entry points, from -X importtime")
+    parser.add_argument("module", nargs="*", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports to list per module")
+    args = parser.parse_args()
+
+    print("{:<22} {:>10} {:>8}  {}".format("module", "total ms", "flask", "heaviest imports (ms)"))
+    for module in args.module:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        total = statistics.median(run[module][1] for run in runs) / 1000
+        last = runs[-1]
+        heaviest = sorted(((cumulative, name) for name, (own, cumulative) in last.items() if name != module),
+                          reverse=True)[:args.top]
+        print("{:<22} {:>10.1f} {:>8}  {}".format(module, total, "yes" if "flask" in last else "no",
+                                                  ", ".join("{} {:.1f}".format(name, cumulative / 1000)
+                                                            for cumulative, name in heaviest)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import itertools
+import os
+import string
+import pathlib
+import tempfile
+
+from peewee import SqliteDatabase
+
+from myapp.create_tables import Race, Driver, DatasetVersion, RaceSource
+from myapp.ingest import ingest
+from myapp.logcache import log_cache
+
+MODELS = (Race, Driver, DatasetVersion, RaceSource)
+
+
+def abbreviations(count):
+    # the log format has three letter driver codes, which caps a race at 26 ** 3 drivers
+    codes = ("".join(letters) for letters in itertools.product(string.ascii_uppercase, repeat=3))
+    return list(itertools.islice(codes, count))
+
+
+def write_race(directory, drivers):
+    directory.mkdir(parents=True)
+    with open(directory / "abbreviations.txt", "w") as racers, \
+            open(directory / "start.log", "w") as starts, open(directory / "end.log", "w") as finishes:
+        for i, abb in enumerate(abbreviations(drivers)):
+            minute = i % 60
+            second = (i * 7) % 60
+            racers.write("{}_Driver {}_TEAM {}\n".format(abb, i, i % 10))
+            starts.write("{}2018-05-24_12:{:02d}:{:02d}.000\n".format(abb, minute, second))
+            finishes.write("{}2018-05-24_1:{:02d}:{:02d}.{:03d}\n".format(abb, minute, second, i % 1000))
+
+
+def run(root, workers):
+    # every run parses from scratch; workers are forked after this and see the same empty cache
+    log_cache.directory = None
+    log_cache.clear()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_db = SqliteDatabase(str(pathlib.Path(tmp) / "ingest.db"))
+        with test_db.bind_ctx(MODELS):
+            test_db.create_tables(MODELS)
+            return ingest(root, workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest throughput by number of parser processes")
+    parser.add_argument("--races", type=int, default=200)
+    parser.add_argument("--drivers", type=int, default=2000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(tmp)
+        for number in range(args.races):
+            write_race(root / "race-{:04d}".format(number), args.drivers)
+
+        print("{:>8} {:>10} {:>10} {:>12}".format("workers", "rows", "seconds", "rows/sec"))
+        workers = 1
+        while True:
+            stats = run(root, workers)
+            print("{:>8} {:>10} {:>10.3f} {:>12.0f}".format(workers, stats["rows"], stats["seconds"],
+                                                             stats["rows_per_sec"]))
+            if workers >= args.max_workers:
+                break
+            workers = min(workers * 2, args.max_workers)
+
+
+if __name__ == "__main__":
+    main()
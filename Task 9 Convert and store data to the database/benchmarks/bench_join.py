@@ -0,0 +1,47 @@
+import argparse
+import time
+
+from myapp.report import count_time, built_report, new_join_issues
+
+
+def synthetic_rows(n):
+    starts = []
+    finishes = []
+    racers = []
+    for i in range(n):
+        abb = "D{:07d}".format(i)
+        minute = i % 60
+        second = (i * 7) % 60
+        starts.append([abb, "2018-05-24", "12:{:02d}:{:02d}.000".format(minute, second)])
+        finishes.append([abb, "2018-05-24", "1:{:02d}:{:02d}.500".format(minute, second)])
+        racers.append([abb, "Driver {}".format(i), "TEAM {}".format(i % 10)])
+    finishes.reverse()
+    return starts, finishes, racers
+
+
+def bench(n):
+    starts, finishes, racers = synthetic_rows(n)
+    issues = new_join_issues()
+    started = time.perf_counter()
+    delta_times = count_time(starts, finishes, issues)
+    report = built_report(delta_times, racers, "asc", "", issues)
+    elapsed = time.perf_counter() - started
+    assert len(report) == n
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Join scaling benchmark for count_time/built_report")
+    parser.add_argument("--max", type=int, default=1000000)
+    args = parser.parse_args()
+
+    n = 1000
+    print("{:>10} {:>10} {:>12}".format("rows", "seconds", "us/row"))
+    while n <= args.max:
+        elapsed = bench(n)
+        print("{:>10} {:>10.3f} {:>12.3f}".format(n, elapsed, elapsed / n * 1e6))
+        n *= 10
+
+
+if __name__ == "__main__":
+    main()
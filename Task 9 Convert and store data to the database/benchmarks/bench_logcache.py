@@ -0,0 +1,54 @@
+import argparse
+import os
+import pathlib
+import tempfile
+import time
+
+from benchmarks.suite import write_race
+from myapp.report import join_logs
+from myapp.logcache import LogCache, RACY_SECONDS
+
+
+def timed(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ordering() on unchanged logs: joined, cached on disk, memoised")
+    parser.add_argument("--drivers", type=int, nargs="*", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print("{:>8} {:>10} {:>10} {:>10} {:>10}".format("drivers", "join ms", "disk ms", "memo ms", "key ms"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for drivers in args.drivers:
+            directory = pathlib.Path(tmp) / "race-{}".format(drivers)
+            write_race(directory, drivers, 0)
+            paths = [directory / name for name in ("start.log", "end.log", "abbreviations.txt")]
+            # old enough for the stat key, like logs of a finished race
+            then = time.time() - RACY_SECONDS * 10
+            for path in paths:
+                os.utime(path, (then, then))
+            cache_dir = pathlib.Path(tmp) / "cache"
+
+            def results(cache):
+                return list(cache.load(paths, join_logs).iter_results("asc", ""))
+
+            join = timed(lambda: list(LogCache(None).load(paths, join_logs).iter_results("asc", "")), args.repeat)
+            results(LogCache(cache_dir))
+            disk = timed(lambda: results(LogCache(cache_dir)), args.repeat)
+            cache = LogCache(cache_dir)
+            results(cache)
+            memo = timed(lambda: results(cache), args.repeat)
+            key = timed(lambda: LogCache(cache_dir).source_key(paths), args.repeat)
+            print("{:>8} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f}".format(drivers, join * 1000, disk * 1000,
+                                                                         memo * 1000, key * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import pathlib
+import tempfile
+import time
+
+from peewee import SqliteDatabase
+
+import myapp.metrics as metrics
+from myapp.create_tables import Race, Driver, DatasetVersion, RaceSource, create_tables, insert_into_driver_table
+from myapp.app import app, record_query
+
+MODELS = (Race, Driver, DatasetVersion, RaceSource)
+PATHS = ["/api/v1.0/report?format=json", "/api/v1.0/report/?order=desc&format=xml",
+         "/api/v1.0/report/drivers/driver?driver_id=SVF&format=json", "/report", "/api/v1.0/report/standings?format=json"]
+
+
+def time_requests(client, path, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(path).get_data()
+    return (time.perf_counter() - started) / requests
+
+
+def time_observe(count):
+    histogram = metrics.Histogram("bench_seconds", "Benchmark.", ("route", "phase"))
+    started = time.perf_counter()
+    for i in range(count):
+        histogram.observe(i * 1e-6, "route", "query")
+    return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request cost of the built-in metrics")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        test_db = SqliteDatabase(str(pathlib.Path(tmp) / "metrics.db"))
+        test_db.query_hooks.append(record_query)
+        with test_db.bind_ctx(MODELS):
+            create_tables()
+            insert_into_driver_table()
+            client = app.test_client()
+
+            print("{:<60} {:>10} {:>10} {:>10}".format("path", "off us", "on us", "overhead"))
+            for path in PATHS:
+                client.get(path).get_data()
+                best = {}
+                # interleaved rounds, best of each, so drift on the machine hits both sides alike
+                for _ in range(args.rounds):
+                    for enabled in (False, True):
+                        metrics.ENABLED = enabled
+                        seconds = time_requests(client, path, args.requests)
+                        best[enabled] = min(best.get(enabled, seconds), seconds)
+                print("{:<60} {:>10.1f} {:>10.1f} {:>+9.1%}".format(path, best[False] * 1e6, best[True] * 1e6,
+                                                                   best[True] / best[False] - 1))
+            metrics.ENABLED = True
+
+    print("histogram observe: {:.2f} us".format(time_observe(200000) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import gzip
+import pathlib
+import tempfile
+import time
+import tracemalloc
+
+from myapp.report import iter_lines, iter_time_records, read_data_from_file, time_file_list
+
+
+def write_log(path, n):
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        for i in range(n):
+            f.write("D{:06d}2018-05-24_12:{:02d}:{:02d}.{:03d}\n".format(i, i % 60, (i * 7) % 60, i % 1000))
+
+
+def measure(parse, path):
+    tracemalloc.start()
+    started = time.perf_counter()
+    parse(path)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def parse_streaming(path):
+    for _ in iter_time_records(iter_lines(path)):
+        pass
+
+
+def parse_lists(path):
+    time_file_list(read_data_from_file(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of the streaming log parser")
+    parser.add_argument("--max", type=int, default=1000000)
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+
+    suffix = ".log.gz" if args.gzip else ".log"
+    print("{:>10} {:>10} {:>14} {:>10} {:>14}".format("lines", "stream s", "stream peak", "list s", "list peak"))
+    with tempfile.TemporaryDirectory() as tmp:
+        n = 1000
+        while n <= args.max:
+            path = pathlib.Path(tmp) / ("start" + suffix)
+            write_log(path, n)
+            stream_time, stream_peak = measure(parse_streaming, path)
+            list_time, list_peak = measure(parse_lists, path)
+            print("{:>10} {:>10.3f} {:>14,} {:>10.3f} {:>14,}".format(n, stream_time, stream_peak,
+                                                                      list_time, list_peak))
+            n *= 10
+
+
+if __name__ == "__main__":
+    main()
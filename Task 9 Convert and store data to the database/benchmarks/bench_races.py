@@ -0,0 +1,58 @@
+import argparse
+import pathlib
+import tempfile
+import time
+
+from peewee import SqliteDatabase, chunked
+
+from myapp.create_tables import Race, Driver, DatasetVersion
+
+MODELS = (Race, Driver, DatasetVersion)
+
+
+def add_races(count, drivers, offset):
+    with Driver._meta.database.atomic():
+        for number in range(offset, offset + count):
+            race = Race.create(name="race-{}".format(number), title="Race {}".format(number))
+            rows = ({"race": race.id, "id": "D{:05d}".format(i), "name": "Driver {}".format(i),
+                     "car": "TEAM {}".format(i % 10), "start_time": 0, "end_time": 3000000 + i * 37 % 100000,
+                     "delta_time": 3000000 + i * 37 % 100000} for i in range(drivers))
+            for batch in chunked(rows, 100):
+                Driver.insert_many(batch).execute()
+
+
+def time_query(race_id, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        query = (Driver
+                 .select(Driver.id, Driver.name, Driver.delta_time)
+                 .where(Driver.race == race_id)
+                 .order_by(Driver.delta_time, Driver.id)
+                 .limit(50))
+        list(query.tuples())
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-race query latency as the number of stored races grows")
+    parser.add_argument("--drivers", type=int, default=1000)
+    parser.add_argument("--max-races", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        test_db = SqliteDatabase(str(pathlib.Path(tmp) / "races.db"))
+        with test_db.bind_ctx(MODELS):
+            test_db.create_tables(MODELS)
+            print("{:>8} {:>10} {:>14}".format("races", "rows", "ms per query"))
+            races = 0
+            target = 1
+            while target <= args.max_races:
+                add_races(target - races, args.drivers, races)
+                races = target
+                print("{:>8} {:>10} {:>14.3f}".format(races, races * args.drivers, time_query(1, args.repeat)))
+                target *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import datetime
+import sys
+
+from benchmarks.bench_ingest import abbreviations
+from myapp.report import (iter_abbreviations, iter_time_records, iter_count_time, built_report, new_join_issues,
+                          parse_timestamp_ms)
+
+
+def synthetic_lines(n):
+    racers, starts, finishes = [], [], []
+    for i, abb in enumerate(abbreviations(n)):
+        minute = i % 60
+        second = (i * 7) % 60
+        racers.append("{}_Driver {}_TEAM {}".format(abb, i, i % 10))
+        starts.append("{}2018-05-24_12:{:02d}:{:02d}.000".format(abb, minute, second))
+        finishes.append("{}2018-05-24_1:{:02d}:{:02d}.{:03d}".format(abb, minute, second, i % 1000))
+    return racers, starts, finishes
+
+
+def legacy_report(racers, starts, finishes):
+    # the mutable list rows the pipeline used before the record types
+    racers = [line.split("_", 2) for line in racers]
+    starts = [[line[:3], line[3:13], line[14:]] for line in starts]
+    finishes = {line[:3]: [line[:3], line[3:13], line[14:]] for line in finishes}
+    times = {}
+    for abb, _, start in starts:
+        end = finishes[abb][2]
+        lap = datetime.timedelta(milliseconds=parse_timestamp_ms(end) - parse_timestamp_ms(start))
+        times[abb] = [abb, start, end, lap]
+    report = []
+    for racer in racers:
+        racer.extend(times[racer[0]][1:4])
+        report.append(racer)
+    return report
+
+
+def record_report(racers, starts, finishes):
+    issues = new_join_issues()
+    return built_report(iter_count_time(iter_time_records(starts), iter_time_records(finishes), issues),
+                        iter_abbreviations(racers), "asc", "", issues)
+
+
+def measure(build, lines, races):
+    # every race has the same roster, read again from its own files; a string shared by several rows is
+    # counted once, the one entry per distinct string in the interpreter's intern table is not counted
+    reports = [build(*[[line.encode().decode() for line in part] for part in lines]) for _ in range(races)]
+    seen = set()
+    size = 0
+    for report in reports:
+        for row in report:
+            for value in (row, *row):
+                if id(value) not in seen:
+                    seen.add(id(value))
+                    size += sys.getsizeof(value)
+    return size / sum(map(len, reports))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory held per report row: list rows against records")
+    parser.add_argument("--drivers", type=int, default=1000)
+    parser.add_argument("--races", type=int, default=100)
+    args = parser.parse_args()
+
+    print("{:>10} {:>8} {:>14} {:>14} {:>8}".format("drivers", "races", "lists B/row", "records B/row", "saved"))
+    lines = synthetic_lines(args.drivers)
+    races = 1
+    while races <= args.races:
+        legacy = measure(legacy_report, lines, races)
+        records = measure(record_report, lines, races)
+        print("{:>10} {:>8} {:>14.0f} {:>14.0f} {:>7.0%}".format(args.drivers, races, legacy, records,
+                                                                  1 - records / legacy))
+        races *= 10
+
+
+if __name__ == "__main__":
+    main()
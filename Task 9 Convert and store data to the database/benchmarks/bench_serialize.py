@@ -0,0 +1,79 @@
+import argparse
+import itertools
+import json
+import time
+
+from dicttoxml import dicttoxml
+from peewee import SqliteDatabase, chunked
+from playhouse.shortcuts import model_to_dict
+
+from myapp import serializers
+from myapp.app import app, select_drivers, REPORT_COLUMNS, NAME_COLUMNS
+from myapp.create_tables import Driver
+
+ROUTES = [
+    ("/api/v1.0/report", {"format": "json"}),
+    ("/api/v1.0/report/", {"order": "desc", "format": "json"}),
+    ("/api/v1.0/report/drivers", {"format": "json"}),
+    ("/api/v1.0/report", {"format": "xml"}),
+    ("/api/v1.0/report/drivers/driver", {"driver_id": "D000042", "format": "json"}),
+]
+
+
+def fill(n):
+    rows = ({"id": "D{:06d}".format(i), "name": "Driver {}".format(i), "car": "TEAM {}".format(i % 10),
+             "start_time": 1000 * i, "end_time": 1000 * i + 3000000 + i, "delta_time": 3000000 + i}
+            for i in range(n))
+    with Driver._meta.database.atomic():
+        for batch in chunked(rows, 100):
+            Driver.insert_many(batch).execute()
+
+
+def legacy_names_body():
+    report = select_drivers(NAME_COLUMNS)
+    data = []
+    for driver_obj in report:
+        driver = model_to_dict(driver_obj, recurse=False)
+        data.append(json.loads(json.dumps(dict(itertools.islice(driver.items(), 2)))))
+    return json.dumps({"total": len(report), "title": "Monaco Racing 2018 Drivers", "drivers": data}) + "\n"
+
+
+def legacy_report_xml():
+    report = select_drivers(REPORT_COLUMNS)
+    drivers = [model_to_dict(driver_obj) for driver_obj in report]
+    return dicttoxml({"total": len(report), "title": "Monaco Racing 2018", "drivers": drivers},
+                     attr_type=False, custom_root="full_report", item_func=lambda x: "driver")
+
+
+def cpu_ms(func, repeat):
+    started = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request CPU time of the API serializers")
+    parser.add_argument("--drivers", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    test_db = SqliteDatabase(":memory:")
+    with test_db.bind_ctx([Driver]):
+        test_db.create_tables([Driver])
+        fill(args.drivers)
+        client = app.test_client()
+
+        print("{} drivers, CPU ms per request".format(args.drivers))
+        print("{:<45} {:>10.3f}".format("legacy model_to_dict names json", cpu_ms(legacy_names_body, args.repeat)))
+        print("{:<45} {:>10.3f}".format("legacy model_to_dict report xml", cpu_ms(legacy_report_xml, args.repeat)))
+        for backend in ("json", "orjson"):
+            serializers.JSON_BACKEND = backend
+            for path, query in ROUTES:
+                label = "{} {} [{}]".format(path, query["format"], backend)
+                elapsed = cpu_ms(lambda: client.get(path, query_string=query), args.repeat)
+                print("{:<45} {:>10.3f}".format(label, elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+import datetime
+import json
+import pathlib
+import tempfile
+import time
+
+from myapp.cache import ResponseCache, SharedResponseCache
+from myapp.app import API_ENCODINGS
+
+
+def body(drivers):
+    rows = [{"id": "D{:04d}".format(i), "name": "Driver {}".format(i), "car": "TEAM {}".format(i % 10),
+             "start_time": "12:00:00.000", "end_time": "1:00:00.000", "delta_time": "1:00:00"}
+            for i in range(drivers)]
+    return json.dumps({"total": drivers, "drivers": rows}).encode("utf-8")
+
+
+def time_gets(cache, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        cache.get("report", "1@2018")
+    return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of a hit in the per-process and the shared response cache")
+    parser.add_argument("--drivers", type=int, nargs="*", default=[20, 1000, 17576])
+    parser.add_argument("--gets", type=int, default=2000)
+    args = parser.parse_args()
+
+    modified = datetime.datetime(2018, 5, 24)
+    print("{:>8} {:>10} {:>14} {:>12} {:>12}".format("drivers", "body KB", "in-process us", "shared us",
+                                                     "compress ms"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for drivers in args.drivers:
+            data = body(drivers)
+            caches = [ResponseCache(), SharedResponseCache(pathlib.Path(tmp) / "responses-{}.db".format(drivers))]
+            started = time.perf_counter()
+            caches[1].set("report", "1@2018", data, "application/json", modified, API_ENCODINGS)
+            compress = time.perf_counter() - started
+            caches[0].set("report", "1@2018", data, "application/json", modified, API_ENCODINGS)
+            local, shared = (time_gets(cache, args.gets) for cache in caches)
+            print("{:>8} {:>10.1f} {:>14.1f} {:>12.1f} {:>12.1f}".format(drivers, len(data) / 1024, local * 1e6,
+                                                                         shared * 1e6, compress * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import concurrent.futures
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def timed_get(get, path):
+    started = time.perf_counter()
+    status, size = get(path)
+    return time.perf_counter() - started, status, size
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent latency test for the report routes")
+    parser.add_argument("--url", help="base URL of a running server; the app is driven in-process if omitted")
+    parser.add_argument("--path", action="append", default=[])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--accept-encoding", help="Accept-Encoding header to send, e.g. 'zstd, br, gzip'")
+    parser.add_argument("--conditional", action="store_true",
+                        help="poll like a caching client: resend the last ETag per path as If-None-Match")
+    parser.add_argument("--miss", action="store_true",
+                        help="empty the response cache before every request, so each one builds and compresses its "
+                             "body; in-process only")
+    args = parser.parse_args()
+    if args.miss and (args.url or args.conditional):
+        parser.error("--miss drives the app in-process and cannot be combined with --url or --conditional")
+    paths = args.path or ["/api/v1.0/report?format=json", "/api/v1.0/report/?order=desc&format=xml",
+                          "/report"]
+
+    etags = {}
+    etags_lock = threading.Lock()
+
+    def request_headers(path):
+        headers = {}
+        if args.accept_encoding:
+            headers["Accept-Encoding"] = args.accept_encoding
+        if args.conditional:
+            with etags_lock:
+                if path in etags:
+                    headers["If-None-Match"] = etags[path]
+        return headers
+
+    def remember(path, etag):
+        if args.conditional and etag:
+            with etags_lock:
+                etags[path] = etag
+
+    if args.url:
+        def get(path):
+            request = urllib.request.Request(args.url.rstrip("/") + path, headers=request_headers(path))
+            try:
+                with urllib.request.urlopen(request) as response:
+                    body = response.read()
+                    remember(path, response.headers.get("ETag"))
+                    return response.status, len(body)
+            except urllib.error.HTTPError as error:
+                return error.code, 0
+    else:
+        from myapp.app import app, response_cache
+        client = app.test_client()
+
+        def get(path):
+            if args.miss:
+                response_cache.clear()
+            response = client.get(path, headers=request_headers(path))
+            remember(path, response.headers.get("ETag"))
+            return response.status_code, len(response.data)
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(lambda i: timed_get(get, paths[i % len(paths)]), range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for latency, status, size in results]
+    errors = sum(1 for latency, status, size in results if status >= 400)
+    not_modified = sum(1 for latency, status, size in results if status == 304)
+    transferred = sum(size for latency, status, size in results)
+    print("requests: {}  concurrency: {}  errors: {}  not modified: {}".format(args.requests, args.concurrency,
+                                                                             errors, not_modified))
+    print("body bytes: {}  ({:.0f} per request)".format(transferred, transferred / args.requests))
+    print("throughput: {:.0f} req/s".format(args.requests / elapsed))
+    print("p50: {:.2f} ms  p99: {:.2f} ms".format(percentile(latencies, 50), percentile(latencies, 99)))
+
+
+if __name__ == "__main__":
+    main()
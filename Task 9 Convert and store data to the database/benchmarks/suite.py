@@ -0,0 +1,224 @@
+import argparse
+import json
+import pathlib
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from peewee import SqliteDatabase
+
+from benchmarks.bench_ingest import abbreviations
+from myapp.report import (read_data_from_file, abbreviation_file_list, time_file_list, count_time, built_report,
+                          ordering, format_timestamp_ms)
+from myapp.create_tables import Race, Driver, DatasetVersion, LogOffset, RaceSource, insert_into_driver_table
+from myapp.ingest import ingest, discover_races, race_files, race_name
+from myapp.logcache import log_cache
+from myapp.snapshot import encode_snapshot, clear_snapshot
+from myapp.app import app, response_cache, driver_totals
+
+MODELS = (Race, Driver, DatasetVersion, LogOffset, RaceSource)
+# three letter codes cap a race at 26 ** 3 drivers, larger sizes are spread over several races
+RACE_DRIVERS = 26 ** 3
+TEAMS = 10
+BASELINE = pathlib.Path(__file__).resolve().parent / "baseline.json"
+# differences below this many seconds are timer noise, whatever the ratio
+NOISE_SECONDS = 0.001
+
+PAGES = ["/report", "/report/?order=asc", "/report/?order=desc", "/report/drivers", "/report/drivers/?order=desc",
+         "/report/drivers/?driver_id={driver}"]
+API_ROUTES = ["/api/v1.0/report?format={format}", "/api/v1.0/report/?order=desc&format={format}",
+              "/api/v1.0/report?format={format}&limit=100", "/api/v1.0/report/drivers?format={format}",
+              "/api/v1.0/report/drivers/ordered?order=asc&format={format}",
+              "/api/v1.0/report/drivers/driver?driver_id={driver}&format={format}",
+              "/api/v1.0/report/standings?format={format}"]
+
+
+def write_race(directory, drivers, seed):
+    # the same seed always writes the same files; start and finish logs are in a different order, like real logs
+    rng = random.Random("{}:{}".format(seed, directory.name))
+    directory.mkdir(parents=True)
+    racers, starts, finishes = [], [], []
+    for i, abb in enumerate(abbreviations(drivers)):
+        start = 12 * 3600000 + rng.randrange(20 * 60000)
+        lap = 60 * 60000 + rng.randrange(15 * 60000)
+        racers.append("{}_Driver {}_TEAM {}\n".format(abb, i, rng.randrange(TEAMS)))
+        starts.append("{}2018-05-24_{}\n".format(abb, format_timestamp_ms(start)))
+        finishes.append("{}2018-05-24_{}\n".format(abb, format_timestamp_ms(start + lap)))
+    rng.shuffle(finishes)
+
+    for name, lines in (("abbreviations.txt", racers), ("start.log", starts), ("end.log", finishes)):
+        with open(directory / name, "w", encoding="utf-8") as stream:
+            stream.writelines(lines)
+
+
+def generate(root, drivers, seed=0):
+    races = -(-drivers // RACE_DRIVERS)
+    for number in range(races):
+        size = drivers // races + (number < drivers % races)
+        write_race(pathlib.Path(root) / "race-{:03d}".format(number), size, seed)
+    return discover_races(root)
+
+
+def timed(function, repeat, setup=None):
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def time_stages(root, directories, repeat):
+    files = [race_files(directory) for directory in directories]
+    parsed = [(time_file_list(read_data_from_file(logs["start"])),
+               time_file_list(read_data_from_file(logs["finish"])),
+               abbreviation_file_list(read_data_from_file(logs["abbreviations"]))) for logs in files]
+
+    def parse():
+        for logs in files:
+            abbreviation_file_list(read_data_from_file(logs["abbreviations"]))
+            time_file_list(read_data_from_file(logs["start"]))
+            time_file_list(read_data_from_file(logs["finish"]))
+
+    def join():
+        for starts, finishes, racers in parsed:
+            built_report(count_time(starts, finishes), racers, "asc", "")
+
+    def report():
+        for logs in files:
+            ordering("asc", "", logs["start"], logs["finish"], logs["abbreviations"])
+
+    def ingest_all():
+        ingest(root, workers=1)
+
+    def cold():
+        # the parsed-log cache and the record of loaded races would turn every run after the first into a no-op
+        log_cache.clear()
+        RaceSource.delete().execute()
+
+    def insert():
+        for directory, logs in zip(directories, files):
+            race = Race.get(Race.name == race_name(directory, root))
+            insert_into_driver_table(race.id, logs["start"], logs["finish"], logs["abbreviations"])
+
+    stages = {"parse": parse, "join": join, "ordering": report, "ordering_cached": report, "ingest": ingest_all,
+              "ingest_unchanged": ingest_all, "insert_into_driver_table": insert, "snapshot": encode_snapshot}
+    cold_stages = {"ordering", "ingest", "insert_into_driver_table"}
+    return {name: timed(stage, repeat, cold if name in cold_stages else None) for name, stage in stages.items()}
+
+
+def routes():
+    for path in PAGES:
+        yield path
+    for path in API_ROUTES:
+        for report_format in ("json", "xml"):
+            yield path.replace("{format}", report_format)
+
+
+def reset_caches():
+    # nothing a previous run or route left in the process, so every run builds its response from the database
+    response_cache.clear()
+    clear_snapshot()
+    driver_totals.clear()
+
+
+def time_routes(race, driver, repeat):
+    client = app.test_client()
+    timings = {}
+    for route in routes():
+        path = "{}&race={}".format(route, race) if "?" in route else "{}?race={}".format(route, race)
+        path = path.replace("{driver}", driver)
+
+        def get():
+            response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError("{} answered {}".format(path, response.status_code))
+            response.get_data()
+
+        timings[route] = timed(get, repeat, setup=reset_caches)
+    return timings
+
+
+def run(drivers, repeat, seed):
+    log_cache.directory = None
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(tmp) / "races"
+        directories = generate(root, drivers, seed)
+        test_db = SqliteDatabase(str(pathlib.Path(tmp) / "suite.db"))
+        with test_db.bind_ctx(MODELS):
+            test_db.create_tables(MODELS)
+            stages = time_stages(root, directories, repeat)
+            race = race_name(directories[0], root)
+            driver = abbreviations(1)[0]
+            return {"stages": stages, "routes": time_routes(race, driver, repeat)}
+
+
+def compare(baseline, results, threshold):
+    regressions = []
+    for size, groups in results.items():
+        for group, timings in groups.items():
+            for name, seconds in timings.items():
+                before = baseline.get(size, {}).get(group, {}).get(name)
+                if before is None:
+                    continue
+                if seconds > before * (1 + threshold) and seconds - before > NOISE_SECONDS:
+                    regressions.append((size, group, name, before, seconds))
+    return regressions
+
+
+def print_results(results, baseline):
+    print("{:>8} {:<8} {:<66} {:>10} {:>10} {:>8}".format("drivers", "kind", "name", "seconds", "baseline",
+                                                          "change"))
+    for size, groups in results.items():
+        for group, timings in groups.items():
+            for name, seconds in timings.items():
+                before = baseline.get(size, {}).get(group, {}).get(name)
+                if before:
+                    print("{:>8} {:<8} {:<66} {:>10.4f} {:>10.4f} {:>+7.0%}".format(
+                        size, group, name, seconds, before, seconds / before - 1))
+                else:
+                    print("{:>8} {:<8} {:<66} {:>10.4f} {:>10} {:>8}".format(size, group, name, seconds, "-", "-"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every pipeline stage and route on generated race logs and "
+                                                 "compare against a stored baseline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="drivers per run, up to 1000000")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the best one is kept")
+    parser.add_argument("--seed", type=int, default=2018)
+    parser.add_argument("--baseline", type=pathlib.Path, default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 is 25%%")
+    parser.add_argument("--save", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        print("running {} drivers".format(size), file=sys.stderr)
+        results[str(size)] = run(size, args.repeat, args.seed)
+
+    stored = json.loads(args.baseline.read_text()) if args.baseline.is_file() else {}
+    baseline = stored.get("results", {})
+    print_results(results, baseline)
+
+    if args.save:
+        baseline.update(results)
+        stored = {"python": platform.python_version(), "machine": platform.machine(), "seed": args.seed,
+                  "results": baseline}
+        args.baseline.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+        print("baseline written to {}".format(args.baseline))
+        return
+
+    regressions = compare(baseline, results, args.threshold)
+    for size, group, name, before, seconds in regressions:
+        print("REGRESSION {} drivers {} {}: {:.4f}s -> {:.4f}s".format(size, group, name, before, seconds))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,27 @@
-from myapp.app import *
-from myapp.report import *
-from myapp.create_tables import *
+import importlib
+
+# what "from myapp import *" used to pull in eagerly; loaded on first use instead, so the parsers, ingest and
+# the other command line tools never import Flask
+EXPORTS = ("myapp.app", "myapp.report", "myapp.create_tables")
+
+
+def load():
+    # same names, same order as the star imports, so the last module wins
+    names = []
+    for module_name in EXPORTS:
+        module = importlib.import_module(module_name)
+        public = {name: value for name, value in vars(module).items() if not name.startswith("_")}
+        globals().update(public)
+        names += public
+    return list(dict.fromkeys(names))
+
+
+def __getattr__(name):
+    if name.startswith("__") and name != "__all__":
+        raise AttributeError(name)
+    names = load()
+    if name == "__all__":
+        return names
+    if name in globals():
+        return globals()[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -1,295 +1,492 @@
 from myapp.create_tables import *
-from flask import Flask, render_template, request, make_response
+from myapp.cache import ResponseCache, SharedResponseCache, available_encodings, choose_encoding, version_etag, variant_etag
+from myapp.serializers import dumps_json, iter_xml
+from myapp.snapshot import current_snapshot
+from myapp.metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, phase, timed_iter, start_request, record_status,
+                           record_query, record_cache, finish_request, render_metrics)
+from flask import Flask, g, render_template, request, stream_with_context
 from flask_restful import Resource, Api, abort
 
-from playhouse.shortcuts import model_to_dict
-from dicttoxml import dicttoxml
-import itertools
-import json
+import os
 
 
+REPORT_FORMATS = ("json", "xml")
+MAX_PAGE_SIZE = 1000
+CONTENT_TYPES = {"json": "application/json", "xml": "application/xml"}
+# cached bodies are stored with these precompressed variants, in server preference order
+HTML_ENCODINGS = ("br", "gzip")
+API_ENCODINGS = ("zstd", "br", "gzip")
+
 app = Flask(__name__, template_folder="../templates", static_folder="../static")
 api = Api(app)
 
+CACHE_MAX_ENTRIES = int(os.environ.get("REPORT_CACHE_MAX_ENTRIES", 256))
+CACHE_TTL = int(os.environ.get("REPORT_CACHE_TTL", 300))
+# when set, every worker process on the host reads and fills the one cache in this SQLite file
+SHARED_CACHE_PATH = os.environ.get("REPORT_SHARED_CACHE_PATH")
+
+if SHARED_CACHE_PATH:
+    response_cache = SharedResponseCache(SHARED_CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+else:
+    response_cache = ResponseCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+db.query_hooks.append(record_query)
+
 
 @app.before_request
 def before_request():
-    db.connect()
+    start_request()
+    with phase("connect"):
+        db.connect(reuse_if_open=True)
 
 
 @app.after_request
 def after_request(response):
-    db.close()
+    record_status(response.status_code)
+    if response.is_streamed:
+        # the body still reads from a cursor on this request's connection, so the request ends when the server
+        # closes the body: after its last chunk, or unread for a HEAD or a client gone before the first chunk
+        g.streamed = True
+        route = request.endpoint
+        response.call_on_close(lambda: end_request(route))
     return response
 
 
+@app.teardown_request
+def teardown_request(exception):
+    # runs on errors too, so the connection always goes back to the pool
+    if not g.get("streamed"):
+        end_request(request.endpoint)
+
+
+def end_request(route):
+    with phase("close"):
+        if not db.is_closed():
+            db.close()
+    finish_request(route or "unmatched")
+
+
+def render_page(template, **context):
+    with phase("render"):
+        return render_template(template, **context)
+
+
+REPORT_COLUMNS = (Driver.id, Driver.name, Driver.car, Driver.start_time, Driver.end_time, Driver.delta_time)
+NAME_COLUMNS = (Driver.id, Driver.name)
+STANDING_FIELDS = ("position", "id", "name", "car", "delta_time", "gap", "interval")
+
+
+def request_snapshot():
+    if "snapshot" not in g:
+        g.snapshot = current_snapshot()
+    return g.snapshot
+
+
+def race_board(race_id):
+    snapshot = request_snapshot()
+    if snapshot is None:
+        return None
+    return snapshot.board(race_id)
+
+
+def current_race():
+    name = request.args.get("race")
+    snapshot = request_snapshot()
+    if snapshot is not None:
+        race = snapshot.race(name) if name is not None else snapshot.races_by_id.get(DEFAULT_RACE_ID)
+    else:
+        race = get_race(name)
+    if race is not None:
+        return race.id, race.title
+    if name is not None:
+        abort(404, message="unknown race {}".format(name))
+    return DEFAULT_RACE_ID, DEFAULT_RACE_TITLE
+
+
+def select_drivers(columns, order="asc", race_id=DEFAULT_RACE_ID):
+    query = Driver.select(*columns).where(Driver.race == race_id)
+    if order == "desc":
+        return query.order_by(Driver.delta_time.desc(), Driver.id.desc())
+    return query.order_by(Driver.delta_time.asc(), Driver.id.asc())
+
+
+def leaderboard(columns, order="asc", race_id=DEFAULT_RACE_ID):
+    board = race_board(race_id)
+    if board is not None:
+        return list(board.rows([column.name for column in columns] + ["place"], order))
+    # the same places as the snapshot and the standings: equal laps share one
+    place = fn.RANK().over(partition_by=[Driver.race], order_by=[Driver.delta_time]).alias("place")
+    return select_drivers(columns, order, race_id).select_extend(place)
+
+
+def select_standings(race_id=DEFAULT_RACE_ID):
+    # one window in (race, delta_time, id) index order, sorted the same way outside it, so SQLite sorts nothing;
+    # a second window for RANK() would need a sort of its own
+    standing = Window(partition_by=[Driver.race], order_by=[Driver.delta_time, Driver.id], alias="standing")
+    return (Driver
+            .select(Driver.id, Driver.name, Driver.car, Driver.delta_time,
+                    Driver.delta_time - fn.FIRST_VALUE(Driver.delta_time).over(standing),
+                    Driver.delta_time - fn.LAG(Driver.delta_time).over(standing))
+            .where(Driver.race == race_id)
+            .window(standing)
+            .order_by(Driver.race, Driver.delta_time, Driver.id))
+
+
+def build_standings():
+    race_id, race_title = current_race()
+    drivers = []
+    # raw cursor: the window results are plain milliseconds, formatted like the lap times
+    cursor = Driver._meta.database.execute(select_standings(race_id))
+    for number, (driver_id, name, car, lap, gap, interval) in enumerate(cursor, 1):
+        # ranked like RANK(): a lap equal to the one before shares its position
+        if interval != 0:
+            position = number
+        drivers.append(dict(zip(STANDING_FIELDS, (
+            position, driver_id, name, car, format_delta_ms(lap), format_delta_ms(gap),
+            None if interval is None else format_delta_ms(interval)))))
+    return {"total": len(drivers), "title": race_title + " Standings", "drivers": drivers}
+
+
+driver_totals = {}
+
+
+def count_drivers(race_id=DEFAULT_RACE_ID):
+    query = Driver.select().where(Driver.race == race_id)
+    dataset_version = g.get("dataset_version") or get_dataset_version()
+    if dataset_version is None:
+        return query.count()
+
+    totals = driver_totals.get(dataset_version.stamp)
+    if totals is None:
+        driver_totals.clear()
+        totals = driver_totals[dataset_version.stamp] = {}
+    if race_id not in totals:
+        totals[race_id] = query.count()
+    return totals[race_id]
+
+
+def page_args():
+    limit = request.args.get("limit")
+    after = request.args.get("after")
+    if limit is not None:
+        # isdecimal, not isdigit: int() rejects digits such as superscripts
+        if not limit.isdecimal() or not 0 < int(limit) <= MAX_PAGE_SIZE:
+            abort(400, message="limit must be between 1 and {}".format(MAX_PAGE_SIZE))
+        limit = int(limit)
+    if after is not None:
+        lap_ms, _, driver_id = after.partition(":")
+        if not lap_ms.isdecimal() or not driver_id:
+            abort(400, message="after must be a cursor returned as 'next'")
+        after = (int(lap_ms), driver_id)
+    return limit, after
+
+
+def build_page(title_suffix, columns, order):
+    race_id, race_title = current_race()
+    title = race_title + title_suffix
+    limit, after = page_args()
+    board = race_board(race_id)
+    if board is not None:
+        names = [column.name for column in columns]
+        if limit is None and after is None:
+            return {"total": len(board), "title": title, "drivers": board.rows(names, order)}
+        drivers, next_cursor = board.page(names, order, limit, after)
+        return {"total": len(board), "title": title, "drivers": drivers, "next": next_cursor}
+
+    query = select_drivers(columns, order, race_id)
+    if limit is None and after is None:
+        return build_report(title, query, count_drivers(race_id))
+
+    with_lap = any(column is Driver.delta_time for column in columns)
+    if not with_lap:
+        query = query.select_extend(Driver.delta_time)
+    if after is not None:
+        key = Tuple(Driver.delta_time, Driver.id)
+        query = query.where(key < Tuple(*after) if order == "desc" else key > Tuple(*after))
+    if limit is not None:
+        query = query.limit(limit)
+
+    drivers = list(query.dicts())
+    next_cursor = None
+    if drivers and limit is not None and len(drivers) == limit:
+        last = drivers[-1]
+        next_cursor = "{}:{}".format(Driver.delta_time.db_value(last["delta_time"]), last["id"])
+    if not with_lap:
+        for driver in drivers:
+            del driver["delta_time"]
+
+    return {"total": count_drivers(race_id), "title": title, "drivers": drivers, "next": next_cursor}
+
+
+def build_report(title, query, total=None):
+    if total is None:
+        total = query.count()
+    return {"total": total, "title": title, "drivers": query.dicts().iterator()}
+
+
+def cache_key(endpoint):
+    args = request.args
+    return (endpoint, args.get("race"), args.get("order"), args.get("format"), args.get("driver_id"),
+            args.get("limit"), args.get("after"))
+
+
+def serialize_report(report, report_format):
+    if report_format == "xml":
+        return app.response_class(stream_with_context(timed_iter(iter_xml(report), "serialize")),
+                                  content_type=CONTENT_TYPES["xml"])
+
+    with phase("serialize"):
+        if report is not None:
+            report = dict(report, drivers=list(report["drivers"]))
+        body = dumps_json(report)
+    return app.response_class(body, content_type=CONTENT_TYPES["json"])
+
+
+def store_when_complete(chunks, key, dataset_version, content_type, encodings=()):
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    with phase("compress"):
+        response_cache.set(key, dataset_version.stamp, b"".join(body), content_type, dataset_version.updated_at,
+                           encodings)
+
+
+def not_modified(etag, encodings, last_modified):
+    candidates = [variant_etag(etag, encoding) for encoding in (None,) + available_encodings(encodings)]
+    matched = next((candidate for candidate in candidates if request.if_none_match.contains(candidate)), None)
+    if matched is None:
+        return None
+
+    response = app.response_class(status=304)
+    response.set_etag(matched)
+    if encodings:
+        response.vary.add("Accept-Encoding")
+    response.last_modified = last_modified
+    return response
+
+
+def cached_response(key, build, encodings=()):
+    snapshot = request_snapshot()
+    dataset_version = g.dataset_version = snapshot.version if snapshot is not None else get_dataset_version()
+    if dataset_version is None:
+        return build()
+
+    etag = version_etag(dataset_version.stamp, key)
+    last_modified = dataset_version.updated_at.replace(microsecond=0)
+    # a repeat poll is answered from its ETag without looking at the cache or building anything
+    response = not_modified(etag, encodings, last_modified)
+    if response is not None:
+        record_cache("not_modified")
+        return response
+
+    entry = response_cache.get(key, dataset_version.stamp)
+    record_cache("miss" if entry is None else "hit")
+    if entry is None:
+        response = build()
+        content_type = response.headers["Content-Type"]
+        if response.is_streamed:
+            # first request streams straight from the cursor and fills the cache on the way
+            response.response = store_when_complete(response.response, key, dataset_version, content_type,
+                                                    encodings)
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            return response
+        with phase("compress"):
+            entry = response_cache.set(key, dataset_version.stamp, response.get_data(), content_type,
+                                       dataset_version.updated_at, encodings)
+
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"), entry.variants)
+    body = entry.body if encoding is None else entry.variants[encoding]
+    response = app.response_class(body, content_type=entry.content_type)
+    if encoding is not None:
+        response.content_encoding = encoding
+    if encodings:
+        response.vary.add("Accept-Encoding")
+    response.set_etag(variant_etag(entry.etag, encoding))
+    response.last_modified = entry.last_modified
+    return response.make_conditional(request)
+
+
+def cached_page(endpoint, render):
+    return cached_response(cache_key(endpoint), lambda: app.make_response(render()), HTML_ENCODINGS)
+
+
 @app.route("/report")
 def report_form():
-    result = (Driver
-              .select(Driver.id, Driver.name, Driver.car, Driver.start_time,
-                      Driver.end_time, Driver.delta_time)
-              .order_by(Driver.delta_time.asc()))
+    def render():
+        race_id, race_title = current_race()
+        result = leaderboard(REPORT_COLUMNS, "asc", race_id)
+
+        return render_page("report_form.html", the_result=result, the_race=request.args.get("race"),
+                           the_race_title=race_title)
 
-    return render_template("report_form.html", the_result=result)
+    return cached_page("report_form", render)
 
 
 class CommonStatistic(Resource):
     def build_api_common_statistic(self):
-        report = (Driver
-                  .select(Driver.id, Driver.name, Driver.car, Driver.start_time,
-                          Driver.end_time, Driver.delta_time)
-                  .order_by(Driver.delta_time.asc()))
-
-        converted_to_dict_report = []
-        for driver_obj in report:
-            driver_dict = model_to_dict(driver_obj)
-            converted_to_dict_report.append(driver_dict)
-
-        return {"total": len(report), "title": "Monaco Racing 2018", "drivers": converted_to_dict_report}
+        return build_page("", REPORT_COLUMNS, "asc")
 
     def get(self):
         report_format = request.args.get("format")
-        if report_format == "json":
-            return self.build_api_common_statistic()
-        elif report_format == "xml":
-            report = self.build_api_common_statistic()
-            drivers_item_func = lambda x: "driver"
-            xml = dicttoxml(report, attr_type=False, custom_root="full_report", item_func=drivers_item_func)
-            response = make_response(xml)
-            response.headers["Content-Type"] = "application/xml"
-            return response
-        else:
+        if report_format not in REPORT_FORMATS:
             abort(404)
 
+        key = cache_key("common_statistic")
+        build = lambda: serialize_report(self.build_api_common_statistic(), report_format)
+        return cached_response(key, build, API_ENCODINGS)
+
 
 @app.route("/report/", methods=["GET"])
 def show_report():
     order = request.args.get("order")
-    if order == "asc":
-        result = (Driver
-                  .select(Driver.id, Driver.name, Driver.car, Driver.start_time,
-                          Driver.end_time, Driver.delta_time)
-                  .order_by(Driver.delta_time.asc()))
-
-        return render_template("show_report.html", the_order=order, the_result=result)
+    if order in ("asc", "desc"):
+        def render():
+            race_id, race_title = current_race()
+            result = leaderboard(REPORT_COLUMNS, order, race_id)
 
-    elif order == "desc":
-        result = (Driver
-                  .select(Driver.id, Driver.name, Driver.car, Driver.start_time,
-                          Driver.end_time, Driver.delta_time)
-                  .order_by(Driver.delta_time.desc()))
+            return render_page("show_report.html", the_order=order, the_result=result,
+                               the_race_title=race_title)
 
-        return render_template("show_report.html", the_order=order, the_result=result)
+        return cached_page("show_report", render)
 
 
 class OrderedCommonStatistic(Resource):
     def build_api_ordered_common_statistic(self):
         order = request.args.get("order")
-        if order == "asc":
-            report = (Driver
-                      .select(Driver.id, Driver.name, Driver.car, Driver.start_time,
-                              Driver.end_time, Driver.delta_time)
-                      .order_by(Driver.delta_time.asc()))
-
-            converted_to_dict_report = []
-            for driver_obj in report:
-                driver_dict = model_to_dict(driver_obj, recurse=False)
-                converted_to_dict_report.append(driver_dict)
-
-            return {"total": len(report), "title": "Monaco Racing 2018", "drivers": converted_to_dict_report}
-
-        elif order == "desc":
-            report = (Driver
-                      .select(Driver.id, Driver.name, Driver.car, Driver.start_time,
-                              Driver.end_time, Driver.delta_time)
-                      .order_by(Driver.delta_time.desc()))
-
-            converted_to_dict_report = []
-            for driver_obj in report:
-                driver_dict = model_to_dict(driver_obj, recurse=False)
-                converted_to_dict_report.append(driver_dict)
-
-            return {"total": len(report), "title": "Monaco Racing 2018", "drivers": converted_to_dict_report}
+        if order in ("asc", "desc"):
+            return build_page("", REPORT_COLUMNS, order)
 
     def get(self):
         report_format = request.args.get("format")
-        if report_format == "json":
-            return self.build_api_ordered_common_statistic()
-        elif report_format == "xml":
-            report = self.build_api_ordered_common_statistic()
-            drivers_item_func = lambda x: "driver"
-            xml = dicttoxml(report, attr_type=False, custom_root="full_report", item_func=drivers_item_func)
-            response = make_response(xml)
-            response.headers["Content-Type"] = "application/xml"
-            return response
-        else:
+        if report_format not in REPORT_FORMATS:
             abort(404)
 
+        key = cache_key("ordered_common_statistic")
+        build = lambda: serialize_report(self.build_api_ordered_common_statistic(), report_format)
+        return cached_response(key, build, API_ENCODINGS)
+
 
 @app.route("/report/drivers")
 def drivers_form():
-    result = (Driver
-              .select(Driver.id, Driver.name)
-              .order_by(Driver.delta_time.asc()))
+    def render():
+        race_id, race_title = current_race()
+        result = leaderboard(NAME_COLUMNS, "asc", race_id)
 
-    return render_template("drivers_form.html", the_result=result)
+        return render_page("drivers_form.html", the_result=result, the_race=request.args.get("race"),
+                           the_race_title=race_title)
+
+    return cached_page("drivers_form", render)
 
 
 class DriversNames(Resource):
     def build_api_drivers_names(self):
-        report = (Driver
-                  .select(Driver.id, Driver.name)
-                  .order_by(Driver.delta_time.asc()))
-
-        converted_to_dict_report = []
-        for driver_obj in report:
-            driver_dict = model_to_dict(driver_obj, recurse=False)
-            converted_to_dict_report.append(driver_dict)
-
-        data = []
-        for driver in converted_to_dict_report:
-            driver_shorten = dict(itertools.islice(driver.items(), 2))
-            driver_converted = json.loads(json.dumps(driver_shorten))
-            data.append(driver_converted)
-
-        return {"total": len(report), "title": "Monaco Racing 2018 Drivers", "drivers": data}
+        return build_page(" Drivers", NAME_COLUMNS, "asc")
 
     def get(self):
         report_format = request.args.get("format")
-        if report_format == "json":
-            return self.build_api_drivers_names()
-        elif report_format == "xml":
-            report = self.build_api_drivers_names()
-            drivers_item_func = lambda x: "driver"
-            xml = dicttoxml(report, attr_type=False, custom_root="full_report", item_func=drivers_item_func)
-            response = make_response(xml)
-            response.headers["Content-Type"] = "application/xml"
-            return response
-        else:
+        if report_format not in REPORT_FORMATS:
             abort(404)
 
+        key = cache_key("drivers_names")
+        build = lambda: serialize_report(self.build_api_drivers_names(), report_format)
+        return cached_response(key, build, API_ENCODINGS)
+
 
 @app.route("/report/drivers/")
 def drivers_report():
+    race_id, race_title = current_race()
     order = request.args.get("order")
     if "order" in request.args:
-        if order == "asc":
-
-            result = (Driver
-                      .select(Driver.id, Driver.name)
-                      .order_by(Driver.delta_time.asc()))
-
-            return render_template("drivers_report.html", the_order=order, the_result=result)
+        if order in ("asc", "desc"):
+            def render():
+                result = leaderboard(NAME_COLUMNS, order, race_id)
 
-        elif order == "desc":
-            result = (Driver
-                      .select(Driver.id, Driver.name, Driver.car, Driver.start_time,
-                              Driver.end_time, Driver.delta_time)
-                      .order_by(Driver.delta_time.desc()))
+                return render_page("drivers_report.html", the_order=order, the_result=result,
+                                   the_race_title=race_title)
 
-            return render_template("drivers_report.html", the_order=order, the_result=result)
+            return cached_page("drivers_report", render)
 
     elif "driver_id" in request.args:
         driver_id = request.args.get("driver_id")
-        result = (Driver
-                  .select(Driver.id, Driver.name, Driver.car, Driver.start_time,
-                          Driver.end_time, Driver.delta_time)
-                  .where(Driver.id == driver_id))
 
-        return render_template("driver_info.html", the_result=result)
+        def render():
+            board = race_board(race_id)
+            if board is not None:
+                driver = board.get(driver_id, [column.name for column in REPORT_COLUMNS] + ["place"])
+                result = [driver] if driver is not None else []
+            else:
+                result = (Driver
+                          .select(*REPORT_COLUMNS)
+                          .where((Driver.race == race_id) & (Driver.id == driver_id)))
+
+            return render_page("driver_info.html", the_result=result, the_race_title=race_title)
+
+        return cached_page("driver_info", render)
 
 
 class OrderedDriversNames(Resource):
     def build_api_ordered_drivers_names(self):
         order = request.args.get("order")
-
-        if order == "asc":
-            report = (Driver
-                      .select(Driver.id, Driver.name)
-                      .order_by(Driver.delta_time.asc()))
-
-            converted_to_dict_report = []
-            for driver_obj in report:
-                driver_dict = model_to_dict(driver_obj, recurse=False)
-                converted_to_dict_report.append(driver_dict)
-
-            data = []
-            for driver in converted_to_dict_report:
-                driver_shorten = dict(itertools.islice(driver.items(), 2))
-                driver_converted = json.loads(json.dumps(driver_shorten))
-                data.append(driver_converted)
-
-            return {"total": len(report), "title": "Monaco Racing 2018 Drivers", "drivers": data}
-
-        elif order == "desc":
-            report = (Driver
-                      .select(Driver.id, Driver.name)
-                      .order_by(Driver.delta_time.desc()))
-
-            converted_to_dict_report = []
-            for driver_obj in report:
-                driver_dict = model_to_dict(driver_obj, recurse=False)
-                converted_to_dict_report.append(driver_dict)
-
-            data = []
-            for driver in converted_to_dict_report:
-                driver_shorten = dict(itertools.islice(driver.items(), 2))
-                driver_converted = json.loads(json.dumps(driver_shorten))
-                data.append(driver_converted)
-
-            return {"total": len(report), "title": "Monaco Racing 2018 Drivers", "drivers": data}
+        if order in ("asc", "desc"):
+            return build_page(" Drivers", NAME_COLUMNS, order)
 
     def get(self):
         report_format = request.args.get("format")
-        if report_format == "json":
-            return self.build_api_ordered_drivers_names()
-        elif report_format == "xml":
-            report = self.build_api_ordered_drivers_names()
-            drivers_item_func = lambda x: "driver"
-            xml = dicttoxml(report, attr_type=False, custom_root="full_report", item_func=drivers_item_func)
-            response = make_response(xml)
-            response.headers["Content-Type"] = "application/xml"
-            return response
-        else:
+        if report_format not in REPORT_FORMATS:
             abort(404)
 
+        key = cache_key("ordered_drivers_names")
+        build = lambda: serialize_report(self.build_api_ordered_drivers_names(), report_format)
+        return cached_response(key, build, API_ENCODINGS)
+
 
 class SingleDriver(Resource):
     def build_api_driver(self):
+        race_id, race_title = current_race()
         driver_id = request.args.get("driver_id")
-        report = (Driver
-                  .select(Driver.id, Driver.name, Driver.car, Driver.start_time,
-                          Driver.end_time, Driver.delta_time)
-                  .where(Driver.id == driver_id))
+        title = race_title + " Driver Information"
+        board = race_board(race_id)
+        if board is not None:
+            driver = board.get(driver_id, [column.name for column in REPORT_COLUMNS])
+            drivers = [driver] if driver is not None else []
+            return {"total": len(drivers), "title": title, "drivers": iter(drivers)}
+
+        query = Driver.select(*REPORT_COLUMNS).where((Driver.race == race_id) & (Driver.id == driver_id))
+        return build_report(title, query)
+
+    def get(self):
+        report_format = request.args.get("format")
+        if report_format not in REPORT_FORMATS:
+            abort(404)
 
-        converted_to_dict_report = []
-        for driver_obj in report:
-            driver_dict = model_to_dict(driver_obj, recurse=False)
-            converted_to_dict_report.append(driver_dict)
+        key = cache_key("driver")
+        build = lambda: serialize_report(self.build_api_driver(), report_format)
+        return cached_response(key, build, API_ENCODINGS)
 
-        return {"total": len(report), "title": "Monaco Racing 2018 Driver Information",
-                "drivers": converted_to_dict_report}
 
+class Standings(Resource):
     def get(self):
         report_format = request.args.get("format")
-        if report_format == "json":
-            return self.build_api_driver()
-        elif report_format == "xml":
-            report = self.build_api_driver()
-            drivers_item_func = lambda x: "driver"
-            xml = dicttoxml(report, attr_type=False, custom_root="full_report", item_func=drivers_item_func)
-            response = make_response(xml)
-            response.headers["Content-Type"] = "application/xml"
-            return response
-        else:
+        if report_format not in REPORT_FORMATS:
             abort(404)
 
+        key = cache_key("standings")
+        build = lambda: serialize_report(build_standings(), report_format)
+        return cached_response(key, build, API_ENCODINGS)
+
+
+@app.route("/metrics")
+def show_metrics():
+    return app.response_class(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
 
 api.add_resource(CommonStatistic, "/api/v1.0/report")
 api.add_resource(OrderedCommonStatistic, "/api/v1.0/report/")
 api.add_resource(DriversNames, "/api/v1.0/report/drivers")
 api.add_resource(OrderedDriversNames, "/api/v1.0/report/drivers/ordered")
 api.add_resource(SingleDriver, "/api/v1.0/report/drivers/driver")
+api.add_resource(Standings, "/api/v1.0/report/standings")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from myapp.app import app
+from myapp.create_tables import DB_MAX_CONNECTIONS
+
+# Flask is synchronous, so each request still holds one of these threads until its body is produced; capping them
+# at the connection pool size keeps queued requests waiting on the event loop instead of on the pool
+query_executor = ThreadPoolExecutor(max_workers=DB_MAX_CONNECTIONS, thread_name_prefix="report-query")
+# chunks a request thread may run ahead of the client before it blocks
+BODY_QUEUE_CHUNKS = 8
+
+
+def build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+
+    for name, value in scope.get("headers", ()):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        value = value.decode("latin-1")
+        if name in environ:
+            value = environ[name] + "," + value
+        environ[name] = value
+    return environ
+
+
+def run_request(environ, loop, queue, disconnected):
+    # the whole request, streamed bodies included, runs in one thread so Flask's contexts stay put
+    def put(item):
+        # waits while the queue is full, so a slow client holds the generator back instead of it buffering the body
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def start_response(status, headers, exc_info=None):
+        put(("start", int(status.split(" ", 1)[0]), headers))
+
+    try:
+        body = app(environ, start_response)
+        try:
+            for chunk in body:
+                if disconnected.is_set():
+                    break
+                if chunk:
+                    put(("body", chunk))
+        finally:
+            # closing the iterable stops a streamed body and gives its connection back, read or not
+            if hasattr(body, "close"):
+                body.close()
+    finally:
+        put(None)
+
+
+async def watch_disconnect(receive, disconnected):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            disconnected.set()
+            return
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        raise ValueError("unsupported scope type {!r}".format(scope["type"]))
+
+    body = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        body.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=BODY_QUEUE_CHUNKS)
+    disconnected = threading.Event()
+    request = loop.run_in_executor(query_executor, run_request, build_environ(scope, b"".join(body)), loop, queue,
+                                   disconnected)
+    watcher = asyncio.ensure_future(watch_disconnect(receive, disconnected))
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if disconnected.is_set():
+                # keep draining, the request thread may be waiting for room to queue its last chunk
+                continue
+            try:
+                if item[0] == "start":
+                    headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in item[2]]
+                    await send({"type": "http.response.start", "status": item[1], "headers": headers})
+                else:
+                    await send({"type": "http.response.body", "body": item[1], "more_body": True})
+            except OSError:
+                disconnected.set()
+    finally:
+        watcher.cancel()
+    await request
+    if not disconnected.is_set():
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the report app from an ASGI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("the async serving mode needs an ASGI server: pip install uvicorn")
+    uvicorn.run("myapp.asgi:application", host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import bisect
+import struct
+
+ROW_FIELDS = ("id", "name", "car", "start_time", "end_time", "delta_time")
+FIELD_SEPARATOR = "\x1f"
+COUNT = struct.Struct("=I")
+
+
+class Board:
+    # one race's results in ascending order; rows are decoded from the buffer only when read
+
+    def __init__(self, buffer, offset):
+        view = memoryview(buffer)
+        self.count = COUNT.unpack_from(buffer, offset)[0]
+        n = self.count
+        start = offset + COUNT.size
+        self.laps = view[start:start + 8 * n].cast("q")
+        start += 8 * n
+        self.offsets = view[start:start + 4 * (n + 1)].cast("I")
+        start += 4 * (n + 1)
+        self.by_id = view[start:start + 4 * n].cast("I")
+        start += 4 * n
+        self.blob = view[start:start + self.offsets[n]]
+        # the board as encode_board wrote it, copied as is into a snapshot where this race did not change
+        self.encoded = view[offset:start + self.offsets[n]]
+
+    def __len__(self):
+        return self.count
+
+    def fields(self, index):
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8").split(FIELD_SEPARATOR)
+
+    def driver_id(self, index):
+        return self.fields(index)[0]
+
+    def row(self, index, columns=ROW_FIELDS):
+        values = dict(zip(ROW_FIELDS, self.fields(index)))
+        row = {column: values[column] for column in columns if column != "place"}
+        if "place" in columns:
+            row["place"] = self.place(index)
+        return row
+
+    def place(self, index):
+        # ranked like RANK(): equal laps share the first place among them
+        return bisect.bisect_left(self.laps, self.laps[index]) + 1
+
+    def indexes(self, order="asc"):
+        if order == "desc":
+            return range(self.count - 1, -1, -1)
+        return range(self.count)
+
+    def rows(self, columns=ROW_FIELDS, order="asc"):
+        return (self.row(index, columns) for index in self.indexes(order))
+
+    def key(self, index):
+        return self.laps[index], self.driver_id(index)
+
+    def page(self, columns, order, limit=None, after=None):
+        if after is None:
+            indexes = self.indexes(order)
+        elif order == "desc":
+            indexes = range(bisect.bisect_left(range(self.count), after, key=self.key) - 1, -1, -1)
+        else:
+            indexes = range(bisect.bisect_right(range(self.count), after, key=self.key), self.count)
+        if limit is not None:
+            indexes = indexes[:limit]
+
+        drivers = [self.row(index, columns) for index in indexes]
+        next_cursor = None
+        if drivers and limit is not None and len(drivers) == limit:
+            next_cursor = "{}:{}".format(*self.key(indexes[-1]))
+        return drivers, next_cursor
+
+    def position(self, driver_id):
+        if not isinstance(driver_id, str):
+            # a request without driver_id: no match, as in the query
+            return None
+        found = bisect.bisect_left(range(self.count), driver_id, key=lambda i: self.driver_id(self.by_id[i]))
+        if found < self.count and self.driver_id(self.by_id[found]) == driver_id:
+            return self.by_id[found]
+        return None
+
+    def get(self, driver_id, columns=ROW_FIELDS):
+        index = self.position(driver_id)
+        if index is None:
+            return None
+        return self.row(index, columns)
+
+
+def encode_board(rows):
+    blobs = [FIELD_SEPARATOR.join(row[:6]).encode("utf-8") for row in rows]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    by_id = sorted(range(len(rows)), key=lambda index: rows[index][0])
+
+    return b"".join([
+        COUNT.pack(len(rows)),
+        struct.pack("=%dq" % len(rows), *(row[6] for row in rows)),
+        struct.pack("=%dI" % len(offsets), *offsets),
+        struct.pack("=%dI" % len(by_id), *by_id),
+        *blobs,
+    ])
@@ -0,0 +1,266 @@
+import collections
+import datetime
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+OPTIONAL_ENCODERS = {"br": brotli, "zstd": zstandard}
+# a miss builds every variant before it answers, so these are request-path levels: on a 2.8 MB report gzip 9,
+# brotli 11 and zstd 19 took 0.25 s, 5 s and 1.5 s for 5-25% smaller bodies
+COMPRESSION_LEVELS = {"gzip": 6, "br": 5, "zstd": 3}
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    body BLOB NOT NULL,
+    content_type TEXT NOT NULL,
+    last_modified TEXT,
+    stored REAL NOT NULL,
+    expires REAL NOT NULL,
+    encodings TEXT NOT NULL,
+    variants BLOB NOT NULL
+)
+"""
+
+logger = logging.getLogger(__name__)
+
+CachedResponse = collections.namedtuple("CachedResponse", ["version", "body", "content_type", "etag", "last_modified",
+                                                           "expires", "variants"])
+
+
+def compress(body, encoding):
+    if encoding == "gzip":
+        # fixed mtime keeps the bytes, and so the ETag, identical between workers
+        return gzip.compress(body, compresslevel=COMPRESSION_LEVELS["gzip"], mtime=0)
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_LEVELS["br"])
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=COMPRESSION_LEVELS["zstd"]).compress(body)
+    raise ValueError("unsupported encoding {!r}".format(encoding))
+
+
+def available_encodings(encodings):
+    return tuple(encoding for encoding in encodings if OPTIONAL_ENCODERS.get(encoding, True) is not None)
+
+
+def encode_variants(body, encodings):
+    variants = {}
+    for encoding in available_encodings(encodings):
+        encoded = compress(body, encoding)
+        if len(encoded) < len(body):
+            variants[encoding] = encoded
+    return variants
+
+
+def version_etag(version, key):
+    # derived from the dataset version alone, so any worker can answer If-None-Match before building a body
+    return hashlib.blake2b("{}|{!r}".format(version, key).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def variant_etag(etag, encoding):
+    if encoding is None:
+        return etag
+    return "{}-{}".format(etag, encoding)
+
+
+def choose_encoding(accept_encoding, encodings):
+    weights = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if name:
+            weights[name.strip().lower()] = weight
+
+    best = None
+    best_weight = 0.0
+    # encodings are in server preference order, so on equal weights the first one wins
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class ResponseCache:
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.version != version or entry.expires < time.monotonic()):
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, version, body, content_type, last_modified=None, encodings=()):
+        etag = version_etag(version, key)
+        if last_modified is not None:
+            last_modified = last_modified.replace(microsecond=0)
+        entry = CachedResponse(version, body, content_type, etag, last_modified, time.monotonic() + self.ttl,
+                               encode_variants(body, encodings))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def pack_variants(variants):
+    # "zstd:812,br:790" and the encoded bodies back to back, in the same order
+    encodings = ",".join("{}:{}".format(encoding, len(encoded)) for encoding, encoded in variants.items())
+    return encodings, b"".join(variants.values())
+
+
+def unpack_variants(encodings, data):
+    variants = {}
+    offset = 0
+    for item in encodings.split(",") if encodings else ():
+        encoding, _, length = item.partition(":")
+        variants[encoding] = data[offset:offset + int(length)]
+        offset += int(length)
+    return variants
+
+
+class SharedResponseCache:
+    # one SQLite file for every worker process on the host: a response is built and compressed once, and a new
+    # dataset version is a miss for all of them at the same time
+
+    def __init__(self, path, max_entries=256, ttl=300):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def connection(self):
+        local = self._local
+        # per thread, and never carried over a fork
+        if getattr(local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=wal")
+            connection.execute("PRAGMA synchronous=normal")
+            connection.execute(SHARED_SCHEMA)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def lookup(self, key, version):
+        row = self.connection().execute(
+            "SELECT body, content_type, last_modified, expires, encodings, variants FROM responses "
+            "WHERE key = ? AND version = ?", (repr(key), version)).fetchone()
+        if row is None:
+            return None
+        body, content_type, last_modified, expires, encodings, variants = row
+        if expires < time.time():
+            return None
+        if last_modified is not None:
+            last_modified = datetime.datetime.fromisoformat(last_modified)
+        return CachedResponse(version, body, content_type, version_etag(version, key), last_modified, expires,
+                              unpack_variants(encodings, variants))
+
+    def get(self, key, version):
+        try:
+            entry = self.lookup(key, version)
+        except sqlite3.Error as error:
+            logger.warning("shared response cache not read: %s", error)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def set(self, key, version, body, content_type, last_modified=None, encodings=()):
+        try:
+            # another worker may have finished the same response in the meantime, then its variants are reused
+            entry = self.lookup(key, version)
+        except sqlite3.Error:
+            entry = None
+        if entry is not None:
+            return entry
+
+        if last_modified is not None:
+            last_modified = last_modified.replace(microsecond=0)
+        now = time.time()
+        entry = CachedResponse(version, body, content_type, version_etag(version, key), last_modified, now + self.ttl,
+                               encode_variants(body, encodings))
+        packed_encodings, packed_variants = pack_variants(entry.variants)
+        try:
+            connection = self.connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, version, body, content_type, last_modified, stored, "
+                    "expires, encodings, variants) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (repr(key), version, body, content_type,
+                     None if last_modified is None else last_modified.isoformat(), now, entry.expires,
+                     packed_encodings, packed_variants))
+                # oldest first, and whatever another version left behind goes before that
+                connection.execute("DELETE FROM responses WHERE expires < ?", (now,))
+                connection.execute(
+                    "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses "
+                    "ORDER BY version = ? DESC, stored DESC LIMIT ?)", (version, self.max_entries))
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        except sqlite3.Error as error:
+            # still served, only not shared
+            logger.warning("shared response cache not written: %s", error)
+        return entry
+
+    def clear(self):
+        connection = self.connection()
+        connection.execute("DELETE FROM responses")
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return self.connection().execute("SELECT count(*) FROM responses").fetchone()[0]
@@ -1,9 +1,54 @@
+import datetime
+import logging
+import os
+import time
+
 from peewee import *
+from playhouse.pool import PooledSqliteDatabase
 from myapp.report import *
+from myapp.logcache import log_cache
 
 DATABASE = "full_report.db"
+DEFAULT_RACE_ID = 1
+DEFAULT_RACE_NAME = "monaco-2018"
+DEFAULT_RACE_TITLE = "Monaco Racing 2018"
+LOAD_PRAGMAS = (("journal_mode", "wal"), ("synchronous", "normal"), ("cache_size", -64000))
+
+# pool settings, overridable per deployment
+DB_MAX_CONNECTIONS = int(os.environ.get("REPORT_DB_MAX_CONNECTIONS", 16))
+DB_STALE_TIMEOUT = int(os.environ.get("REPORT_DB_STALE_TIMEOUT", 300))
+DB_WAIT_TIMEOUT = int(os.environ.get("REPORT_DB_WAIT_TIMEOUT", 10))
+
+db = PooledSqliteDatabase(DATABASE, max_connections=DB_MAX_CONNECTIONS, stale_timeout=DB_STALE_TIMEOUT,
+                          timeout=DB_WAIT_TIMEOUT, check_same_thread=False)
+
+logger = logging.getLogger(__name__)
+
+
+class ClockTimeField(IntegerField):
+    def db_value(self, value):
+        if isinstance(value, str):
+            value = parse_timestamp_ms(value)
+        return super().db_value(value)
+
+    def python_value(self, value):
+        if value is None:
+            return None
+        return format_timestamp_ms(value)
 
-db = SqliteDatabase(DATABASE)
+
+class LapTimeField(IntegerField):
+    def db_value(self, value):
+        if isinstance(value, datetime.timedelta):
+            value = value // datetime.timedelta(milliseconds=1)
+        elif isinstance(value, str):
+            value = parse_delta_ms(value)
+        return super().db_value(value)
+
+    def python_value(self, value):
+        if value is None:
+            return None
+        return format_delta_ms(value)
 
 
 class BaseModel(Model):
@@ -11,31 +56,213 @@ class BaseModel(Model):
         database = db
 
 
-class Driver(BaseModel):
-    id = CharField(primary_key=True)
+class Race(BaseModel):
     name = CharField(unique=True)
+    title = CharField()
+
+    class Meta:
+        db_table = "Races"
+
+
+class Driver(BaseModel):
+    race = ForeignKeyField(Race, default=DEFAULT_RACE_ID, constraints=[SQL("DEFAULT %d" % DEFAULT_RACE_ID)],
+                           index=False, backref="results")
+    id = CharField()
+    name = CharField()
     car = CharField()
-    start_time = CharField()
-    end_time = CharField()
-    delta_time = CharField()
+    start_time = ClockTimeField()
+    end_time = ClockTimeField()
+    delta_time = LapTimeField()
 
     class Meta:
         db_table = "Drivers_Results"
+        primary_key = CompositeKey("race", "id")
+        # keyset pagination walks (race, delta_time, id), so one index serves ordering and cursors per race
+        indexes = (
+            (("race", "name"), True),
+            (("race", "delta_time", "id"), False),
+        )
+
+
+class DatasetVersion(BaseModel):
+    id = IntegerField(primary_key=True)
+    version = IntegerField()
+    updated_at = DateTimeField()
+
+    class Meta:
+        db_table = "Dataset_Version"
+
+    @property
+    def stamp(self):
+        # the counter restarts when a database is recreated, the timestamp tells those apart
+        return "{}@{}".format(self.version, self.updated_at.isoformat())
+
+
+class LogOffset(BaseModel):
+    race = ForeignKeyField(Race, backref="log_offsets")
+    log = CharField()
+    position = IntegerField(default=0)
+
+    class Meta:
+        db_table = "Log_Offsets"
+        primary_key = CompositeKey("race", "log")
+
+
+class RaceSource(BaseModel):
+    # content key of the logs a race was last loaded from
+    race = ForeignKeyField(Race, primary_key=True, backref="sources")
+    key = CharField()
+
+    class Meta:
+        db_table = "Race_Sources"
 
 
 def create_tables():
     with db:
-        db.create_tables([Driver])
+        db.create_tables([Race, Driver, DatasetVersion, LogOffset, RaceSource])
+        (Race
+         .insert(id=DEFAULT_RACE_ID, name=DEFAULT_RACE_NAME, title=DEFAULT_RACE_TITLE)
+         .on_conflict_ignore()
+         .execute())
 
 
-def insert_into_driver_table():
-    all_rows = ordering(order="asc", driver_id="")
+def get_race(name=None):
+    try:
+        if name is None:
+            return Race.get_or_none(Race.id == DEFAULT_RACE_ID)
+        return Race.get_or_none(Race.name == name)
+    except OperationalError:
+        return None
 
-    Driver.insert_many(all_rows).execute()
+
+def get_or_create_race(name, title):
+    race, _ = Race.get_or_create(name=name, defaults={"title": title})
+    return race
+
+
+def bump_dataset_version():
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    (DatasetVersion
+     .insert(id=1, version=1, updated_at=now)
+     .on_conflict(conflict_target=[DatasetVersion.id],
+                  update={DatasetVersion.version: DatasetVersion.version + 1, DatasetVersion.updated_at: now})
+     .execute())
+
+
+def get_dataset_version():
+    try:
+        return DatasetVersion.get_or_none(DatasetVersion.id == 1)
+    except OperationalError:
+        return None
+
+
+def migrate_driver_table():
+    database = Driver._meta.database
+    table = Driver._meta.table_name
+    if not database.table_exists(table):
+        return False
+
+    columns = {column.name: column.data_type.upper() for column in database.get_columns(table)}
+    if columns.get("delta_time") == "INTEGER" and "race_id" in columns:
+        return False
+
+    legacy_table = table + "_legacy"
+    fields = ["id", "name", "car", "start_time", "end_time", "delta_time"]
+    if "race_id" in columns:
+        fields.append("race_id")
+    with database.atomic():
+        database.execute_sql('ALTER TABLE "%s" RENAME TO "%s"' % (table, legacy_table))
+        for index in database.get_indexes(legacy_table):
+            if index.sql:
+                database.execute_sql('DROP INDEX "%s"' % index.name)
+        database.create_tables([Driver])
+
+        cursor = database.execute_sql('SELECT %s FROM "%s"' % (", ".join(fields), legacy_table))
+        rows = [dict(zip(fields, row)) for row in cursor.fetchall()]
+        for row in rows:
+            row["race"] = row.pop("race_id", DEFAULT_RACE_ID)
+        if rows:
+            Driver.insert_many(rows).execute()
+        database.execute_sql('DROP TABLE "%s"' % legacy_table)
+    return True
+
+
+def write_driver_rows(rows, batch_size=None, fields=None):
+    database = Driver._meta.database
+    if batch_size is None:
+        # stay under SQLITE_MAX_VARIABLE_NUMBER of older SQLite builds
+        batch_size = 999 // len(Driver._meta.fields)
+
+    count = 0
+    if fields is None:
+        for batch in chunked(rows, batch_size):
+            Driver.insert_many(batch).on_conflict_replace().execute()
+            count += len(batch)
+    else:
+        # rows are tuples of database values already, so build the statement once and reuse it
+        sql, _ = Driver.insert({field: None for field in fields}).on_conflict_replace().sql()
+        cursor = database.cursor()
+        for batch in chunked(rows, batch_size):
+            cursor.executemany(sql, batch)
+            count += len(batch)
+    return count
+
+
+def apply_load_pragmas():
+    database = Driver._meta.database
+    for key, value in LOAD_PRAGMAS:
+        database.pragma(key, value)
+
+
+def bulk_insert_into_driver_table(rows, batch_size=None, fields=None, replace_races=()):
+    # rows of replace_races are all dropped first, so drivers missing from the new rows do not linger
+    apply_load_pragmas()
+
+    started = time.perf_counter()
+    with Driver._meta.database.atomic():
+        if replace_races:
+            Driver.delete().where(Driver.race.in_(list(replace_races))).execute()
+        count = write_driver_rows(rows, batch_size, fields)
+        bump_dataset_version()
+    seconds = time.perf_counter() - started
+
+    stats = {"rows": count, "seconds": seconds, "rows_per_sec": count / seconds if seconds else 0.0}
+    logger.info("loaded %(rows)d rows in %(seconds).3fs (%(rows_per_sec).0f rows/sec)", stats)
+    return stats
+
+
+def get_race_sources():
+    return dict(RaceSource.select(Race.name, RaceSource.key).join(Race).tuples())
+
+
+def record_race_sources(sources):
+    # written after the rows they describe: a crash in between only means the race is loaded again next time
+    with RaceSource._meta.database.atomic():
+        for batch in chunked(sources, 400):
+            RaceSource.insert_many(batch, fields=[RaceSource.race, RaceSource.key]).on_conflict_replace().execute()
+
+
+def insert_into_driver_table(race=DEFAULT_RACE_ID, start_file=START_DATA_FILE, finish_file=FINISH_DATA_FILE,
+                             abbreviations_file=ABBREVIATIONS_FILE):
+    # like ingest, a race whose logs are unchanged since it was last loaded is not parsed or written again
+    key = log_cache.source_key([start_file, finish_file, abbreviations_file])
+    source = RaceSource.get_or_none(RaceSource.race == race)
+    if source is not None and source.key == key:
+        logger.info("race %s is unchanged since it was loaded, skipped", source.race_id)
+        return {"rows": 0, "skipped": True, "seconds": 0.0, "rows_per_sec": 0.0}
+
+    all_rows = iter_ordering("asc", "", start_file, finish_file, abbreviations_file)
+    stats = bulk_insert_into_driver_table((dict(row, race=race) for row in all_rows), replace_races=[race])
+    record_race_sources([(race, key)])
+    return dict(stats, skipped=False)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrate_driver_table()
     create_tables()
-    insert_into_driver_table()
-
+    stats = insert_into_driver_table()
 
+    from myapp.snapshot import SNAPSHOT_PATH, publish_snapshot
+    if SNAPSHOT_PATH and not stats["skipped"]:
+        publish_snapshot()
@@ -0,0 +1,136 @@
+import argparse
+import io
+import logging
+import pathlib
+import time
+
+from myapp.report import iter_lines, iter_time_records, iter_abbreviations, parse_timestamp_ms
+from myapp.create_tables import (Driver, LogOffset, migrate_driver_table, create_tables, get_or_create_race,
+                                 apply_load_pragmas, write_driver_rows, bump_dataset_version, get_dataset_version)
+from myapp.ingest import LOG_NAMES, ROW_FIELDS, race_title
+from myapp.snapshot import SNAPSHOT_PATH, publish_snapshot
+
+POLL_INTERVAL = 0.01
+
+logger = logging.getLogger(__name__)
+
+
+class LogFollower:
+    def __init__(self, race, directory):
+        self.race = race
+        self.directory = pathlib.Path(directory)
+        self.offsets = {kind: 0 for kind in LOG_NAMES}
+        self.records = {kind: {} for kind in LOG_NAMES}
+
+        saved = {offset.log: offset.position for offset in LogOffset.select().where(LogOffset.race == race)}
+        # rebuild the join state from what was already consumed, without writing anything
+        for kind in LOG_NAMES:
+            if saved.get(kind):
+                self.read(kind, saved[kind])
+
+    def path(self, kind):
+        return self.directory / LOG_NAMES[kind]
+
+    def read(self, kind, limit=None):
+        path = self.path(kind)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return set()
+        if size < self.offsets[kind]:
+            logger.warning("%s was truncated, reading it again from the start", path)
+            self.offsets[kind] = 0
+            self.records[kind].clear()
+        if limit is None:
+            limit = size
+        if limit <= self.offsets[kind]:
+            return set()
+
+        with open(path, "rb") as stream:
+            stream.seek(self.offsets[kind])
+            chunk = stream.read(limit - self.offsets[kind])
+        # a line is only complete once its newline has been written
+        chunk = chunk[:chunk.rfind(b"\n") + 1]
+        if not chunk:
+            return set()
+        self.offsets[kind] += len(chunk)
+
+        lines = iter_lines(io.BytesIO(chunk))
+        if kind == "abbreviations":
+            records = ((abb, (name, car)) for abb, name, car in iter_abbreviations(lines))
+        else:
+            records = ((abb, parse_timestamp_ms(stamp)) for abb, _, stamp in iter_time_records(lines))
+
+        index = self.records[kind]
+        changed = set()
+        for abb, value in records:
+            # first occurrence wins, like the batch join
+            if abb not in index:
+                index[abb] = value
+                changed.add(abb)
+        return changed
+
+    def row(self, abb):
+        racer = self.records["abbreviations"].get(abb)
+        start = self.records["start"].get(abb)
+        end = self.records["finish"].get(abb)
+        if racer is None or start is None or end is None:
+            return None
+        return (self.race.id, abb, *racer, start, end, end - start)
+
+    def poll(self):
+        consumed = dict(self.offsets)
+        changed = set()
+        for kind in LOG_NAMES:
+            changed |= self.read(kind)
+        if consumed == self.offsets:
+            return []
+        rows = [row for row in map(self.row, sorted(changed)) if row is not None]
+
+        # upserted rows, the version bump and the new offsets commit together, so a restart never skips lines
+        with Driver._meta.database.atomic():
+            if rows:
+                since = get_dataset_version()
+                write_driver_rows(rows, fields=ROW_FIELDS)
+                bump_dataset_version()
+            (LogOffset
+             .insert_many([(self.race.id, kind, position) for kind, position in self.offsets.items()],
+                          [LogOffset.race, LogOffset.log, LogOffset.position])
+             .on_conflict_replace()
+             .execute())
+        if rows and SNAPSHOT_PATH:
+            # only this race's board is encoded again, the others are copied from the published snapshot
+            publish_snapshot(SNAPSHOT_PATH, changed={self.race.id}, since=since)
+        return [row[1] for row in rows]
+
+
+def follow(race, directory, interval=POLL_INTERVAL, stop=None):
+    apply_load_pragmas()
+    follower = LogFollower(race, directory)
+    while stop is None or not stop():
+        updated = follower.poll()
+        if updated:
+            logger.info("%s: updated %s", race.name, ", ".join(updated))
+        else:
+            time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Follow the race logs in DIRECTORY and load new results live")
+    parser.add_argument("directory", type=pathlib.Path)
+    parser.add_argument("--race", help="race name (default: the directory name)")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between polls when idle")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    migrate_driver_table()
+    create_tables()
+    name = args.race or args.directory.resolve().name
+    try:
+        follow(get_or_create_race(name, race_title(name)), args.directory, args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
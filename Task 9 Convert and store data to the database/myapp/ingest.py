@@ -0,0 +1,164 @@
+import argparse
+import logging
+import os
+import pathlib
+import sys
+import time
+
+from myapp.report import join_logs, parse_timestamp_ms
+from myapp.logcache import log_cache
+from myapp.create_tables import (Driver, migrate_driver_table, create_tables, get_or_create_race,
+                                 bulk_insert_into_driver_table, get_race_sources, record_race_sources)
+from myapp.snapshot import SNAPSHOT_PATH, publish_snapshot
+
+LOG_NAMES = {"start": "start.log", "finish": "end.log", "abbreviations": "abbreviations.txt"}
+LOG_SUFFIXES = ("", ".gz", ".bz2")
+COMMIT_ROWS = 20000
+ROW_FIELDS = (Driver.race, Driver.id, Driver.name, Driver.car, Driver.start_time, Driver.end_time,
+              Driver.delta_time)
+
+logger = logging.getLogger(__name__)
+
+
+def find_log(directory, name):
+    for suffix in LOG_SUFFIXES:
+        path = directory / (name + suffix)
+        if path.is_file():
+            return path
+    return None
+
+
+def race_files(directory):
+    directory = pathlib.Path(directory)
+    files = {kind: find_log(directory, name) for kind, name in LOG_NAMES.items()}
+    if None in files.values():
+        return None
+    return files
+
+
+def log_paths(files):
+    return files["start"], files["finish"], files["abbreviations"]
+
+
+def discover_races(root):
+    root = pathlib.Path(root)
+    directories = [root] + sorted(path for path in root.rglob("*") if path.is_dir())
+    return [directory for directory in directories if race_files(directory) is not None]
+
+
+def race_name(directory, root):
+    relative = pathlib.Path(directory).relative_to(root)
+    if relative.parts:
+        return "-".join(relative.parts)
+    return pathlib.Path(root).resolve().name
+
+
+def race_title(name):
+    return name.replace("-", " ").replace("_", " ").title()
+
+
+def parse_race(directory):
+    # runs in a worker process: parse, join and convert times so the writer only has to insert;
+    # logs that were joined before come back from the log cache
+    race = log_cache.load(log_paths(race_files(directory)), join_logs)
+    return [(abb, name, car, parse_timestamp_ms(start), parse_timestamp_ms(end), lap)
+            for abb, name, car, start, end, lap in race.rows()]
+
+
+def iter_parsed(directories, workers):
+    if workers == 1:
+        for directory in directories:
+            yield directory, parse_race(directory)
+        return
+
+    # imported here: multiprocessing is a sizeable share of startup and a single worker never needs it
+    from concurrent.futures import ProcessPoolExecutor
+
+    # workers use the same log cache directory, also when they are spawned rather than forked
+    with ProcessPoolExecutor(max_workers=workers, initializer=log_cache.use,
+                             initargs=(log_cache.directory,)) as executor:
+        chunksize = max(1, len(directories) // (workers * 4))
+        yield from zip(directories, executor.map(parse_race, directories, chunksize=chunksize))
+
+
+def ingest(root, workers=None, commit_rows=COMMIT_ROWS, progress=None):
+    root = pathlib.Path(root)
+    stats = {"races": 0, "skipped": 0, "rows": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+    started = time.perf_counter()
+
+    # a race whose logs are unchanged since it was last loaded is not parsed or written again
+    loaded = get_race_sources()
+    keys = {}
+    for directory in discover_races(root):
+        key = log_cache.source_key(log_paths(race_files(directory)))
+        if loaded.get(race_name(directory, root)) == key:
+            stats["skipped"] += 1
+        else:
+            keys[directory] = key
+    directories = list(keys)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(directories) or 1))
+
+    pending = []
+    sources = []
+
+    def flush():
+        if pending or sources:
+            # a race's rows always go out in one flush, so its old rows are replaced in one transaction
+            bulk_insert_into_driver_table(pending, fields=ROW_FIELDS,
+                                          replace_races=[race_id for race_id, _ in sources])
+            pending.clear()
+        if sources:
+            record_race_sources(sources)
+            sources.clear()
+
+    # this process is the only writer, workers never touch the database
+    for done, (directory, rows) in enumerate(iter_parsed(directories, workers), 1):
+        name = race_name(directory, root)
+        race = get_or_create_race(name, race_title(name))
+        pending.extend((race.id, *row) for row in rows)
+        sources.append((race.id, keys[directory]))
+        if len(pending) >= commit_rows:
+            flush()
+
+        stats["races"] = done
+        stats["rows"] += len(rows)
+        if progress is not None:
+            progress(done, len(directories), name, len(rows))
+    flush()
+
+    stats["seconds"] = time.perf_counter() - started
+    if stats["seconds"]:
+        stats["rows_per_sec"] = stats["rows"] / stats["seconds"]
+    logger.info("ingested %(races)d races (%(skipped)d unchanged), %(rows)d rows in %(seconds).3fs (%(rows_per_sec).0f rows/sec)", stats)
+    return stats
+
+
+def print_progress(done, total, name, rows):
+    print("[{}/{}] {}: {} drivers".format(done, total, name, rows), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load every race log directory under ROOT into the database")
+    parser.add_argument("root", type=pathlib.Path)
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--commit-rows", type=int, default=COMMIT_ROWS, help="rows per write transaction")
+    parser.add_argument("--quiet", action="store_true", help="do not print per-race progress")
+    parser.add_argument("--log-cache", metavar="DIR", default=log_cache.directory,
+                        help="keep joined logs in DIR for later runs (default: $REPORT_LOG_CACHE_DIR, or none)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    log_cache.use(args.log_cache)
+    migrate_driver_table()
+    create_tables()
+    stats = ingest(args.root, args.workers, args.commit_rows, None if args.quiet else print_progress)
+    if SNAPSHOT_PATH:
+        publish_snapshot()
+    print("{races} races ({skipped} unchanged), {rows} rows in {seconds:.2f}s ({rows_per_sec:.0f} rows/sec)".format(**stats))
+
+
+if __name__ == "__main__":
+    main()
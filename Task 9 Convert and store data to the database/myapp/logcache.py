@@ -0,0 +1,194 @@
+import datetime
+import hashlib
+import importlib.util
+import logging
+import mmap
+import os
+import pathlib
+import time
+
+from myapp.board import Board, encode_board
+
+# persistent only when set; otherwise joined results are kept in memory by this process
+CACHE_DIR = os.environ.get("REPORT_LOG_CACHE_DIR")
+CACHE_MAGIC = b"LGC1"
+# the parser, the join and the encoding: results from any other version of them are never reused
+CODE_MODULES = ("myapp.report", "myapp.board", "myapp.logcache")
+# a file written this recently may change again within the same mtime tick, so its contents are hashed instead
+RACY_SECONDS = 2
+MEMO_ENTRIES = 64
+
+logger = logging.getLogger(__name__)
+
+
+def code_version(modules=CODE_MODULES):
+    digest = hashlib.blake2b(digest_size=8)
+    for name in modules:
+        # whatever the module was loaded from: the source, the bytecode of a sourceless install or a zip member
+        spec = importlib.util.find_spec(name)
+        try:
+            digest.update(spec.loader.get_data(spec.origin))
+        except (AttributeError, TypeError, OSError):
+            # a loader with nothing to read: entries are told apart by the cache format alone
+            return CACHE_MAGIC.decode("ascii")
+    return digest.hexdigest()
+
+
+CODE_VERSION = code_version()
+
+
+class ParsedRace:
+    # the joined results of one set of logs, in the ascending order ordering() returns
+
+    def __init__(self, buffer, key):
+        self.buffer = buffer
+        self.key = key
+        self.board = Board(buffer, len(CACHE_MAGIC))
+        self._descending = None
+
+    def __len__(self):
+        return len(self.board)
+
+    def indexes(self, order):
+        if order != "desc":
+            return range(len(self.board))
+        if self._descending is None:
+            # the stable descending sort of the join: equal laps keep their abbreviation file order
+            laps = self.board.laps
+            self._descending = sorted(range(len(self.board)), key=laps.__getitem__, reverse=True)
+        return self._descending
+
+    def result(self, index):
+        abb, name, car, start, end, _ = self.board.fields(index)
+        return dict(id=abb, name=name, car=car, start_time=start, end_time=end,
+                    delta_time=datetime.timedelta(milliseconds=self.board.laps[index]))
+
+    def iter_results(self, order, driver_id):
+        if driver_id != "":
+            index = self.board.position(driver_id)
+            indexes = [] if index is None else [index]
+        else:
+            indexes = self.indexes(order)
+        return map(self.result, indexes)
+
+    def rows(self):
+        for index in range(len(self.board)):
+            abb, name, car, start, end, _ = self.board.fields(index)
+            yield abb, name, car, start, end, self.board.laps[index]
+
+
+def encode_results(results):
+    # results of the join: (abbreviation, name, car, start, end, lap timedelta), ascending
+    rows = [(abb, name, car, start, end, str(lap), lap // datetime.timedelta(milliseconds=1))
+            for abb, name, car, start, end, lap in results]
+    return CACHE_MAGIC + encode_board(rows)
+
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as stream:
+        for block in iter(lambda: stream.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stat_key(paths):
+    # cheap identity of the files as they are now; None when one of them is too fresh to trust
+    now = time.time()
+    parts = [CODE_VERSION]
+    for path in paths:
+        stat = os.stat(path)
+        if now - stat.st_mtime < RACY_SECONDS:
+            return None
+        parts.append("{}|{}|{}|{}".format(os.path.abspath(path), stat.st_ino, stat.st_size, stat.st_mtime_ns))
+    return hashlib.blake2b("\n".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def content_key(paths):
+    parts = [CODE_VERSION] + [file_digest(path) for path in paths]
+    return hashlib.blake2b("\n".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def write_file(data, path):
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "wb") as stream:
+        stream.write(data)
+    os.replace(temporary, path)
+
+
+def read_file(path):
+    try:
+        return pathlib.Path(path).read_text()
+    except FileNotFoundError:
+        return None
+
+
+def map_file(path):
+    try:
+        with open(path, "rb") as stream:
+            return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class LogCache:
+    def __init__(self, directory=CACHE_DIR):
+        self.keys = {}
+        self.races = {}
+        self.use(directory)
+
+    def use(self, directory):
+        self.directory = pathlib.Path(directory) if directory else None
+
+    def clear(self):
+        self.keys.clear()
+        self.races.clear()
+
+    def source_key(self, paths):
+        # the content key of a set of logs, hashing them only when size or mtime moved
+        fast = stat_key(paths)
+        if fast is not None:
+            key = self.keys.get(fast)
+            if key is None and self.directory is not None:
+                key = read_file(self.directory / ("stat-" + fast))
+            if key:
+                self.keys[fast] = key
+                return key
+
+        key = content_key(paths)
+        if fast is not None:
+            self.keys[fast] = key
+            if self.directory is not None:
+                self.store(self.directory / ("stat-" + fast), key.encode("ascii"))
+        return key
+
+    def store(self, path, data):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_file(data, path)
+        except OSError as error:
+            logger.debug("log cache not written: %s", error)
+
+    def load(self, paths, join):
+        key = self.source_key(paths)
+        race = self.races.get(key)
+        if race is not None:
+            return race
+
+        buffer = None
+        path = None
+        if self.directory is not None:
+            path = self.directory / (key + ".bin")
+            buffer = map_file(path)
+        if buffer is None or buffer[:len(CACHE_MAGIC)] != CACHE_MAGIC:
+            buffer = encode_results(join(*paths))
+            if path is not None:
+                self.store(path, buffer)
+
+        if len(self.races) >= MEMO_ENTRIES:
+            self.races.clear()
+        race = self.races[key] = ParsedRace(buffer, key)
+        return race
+
+
+log_cache = LogCache()
@@ -0,0 +1,234 @@
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+
+# on by default: a request costs a few dictionary updates and one lock per histogram
+ENABLED = os.environ.get("REPORT_METRICS", "1") != "0"
+SLOW_REQUEST_SECONDS = float(os.environ.get("REPORT_SLOW_REQUEST_SECONDS", 1.0))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = ['{}="{}"'.format(name, escape_label(value)) for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            series = sorted(self.series.items())
+        for labels, value in series:
+            yield self.name, format_labels(self.labels, labels), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self.series.items())
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield self.name + "_bucket", format_labels(self.labels, labels, [("le", format_value(bound))]), \
+                    cumulative
+            yield self.name + "_sum", format_labels(self.labels, labels), total
+            yield self.name + "_count", format_labels(self.labels, labels), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append("# HELP {} {}".format(metric.name, metric.documentation))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            lines.extend("{}{} {}".format(name, labels, format_value(value))
+                         for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+request_seconds = registry.register(Histogram(
+    "report_request_duration_seconds", "Time from the first hook to the end of the response, streamed bodies included.",
+    ("route", "status")))
+phase_seconds = registry.register(Histogram(
+    "report_request_phase_seconds", "Time spent in each phase of a request; phases do not overlap.",
+    ("route", "phase")))
+request_queries = registry.register(Histogram(
+    "report_request_queries", "SQL statements executed per request.", ("route",), QUERY_BUCKETS))
+cache_lookups = registry.register(Counter(
+    "report_cache_lookups_total", "Response cache lookups by result.", ("result",)))
+
+
+class RequestMetrics:
+    __slots__ = ("started", "mark", "stack", "phases", "queries", "status")
+
+    def __init__(self):
+        self.started = self.mark = time.perf_counter()
+        self.stack = []
+        self.phases = {}
+        self.queries = 0
+        self.status = None
+
+    def enter(self, name):
+        now = time.perf_counter()
+        if self.stack:
+            outer = self.stack[-1]
+            self.phases[outer] = self.phases.get(outer, 0.0) + now - self.mark
+        self.stack.append(name)
+        self.mark = now
+
+    def exit(self):
+        now = time.perf_counter()
+        name = self.stack.pop()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self.mark
+        self.mark = now
+
+    def add_query(self, seconds):
+        # reported after the fact, so it is taken back out of whatever phase ran the query
+        self.queries += 1
+        self.phases["query"] = self.phases.get("query", 0.0) + seconds
+        if self.stack:
+            outer = self.stack[-1]
+            self.phases[outer] = self.phases.get(outer, 0.0) - seconds
+
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class phase:
+    __slots__ = ("name", "metrics")
+
+    def __init__(self, name):
+        self.name = name
+        self.metrics = None
+
+    def __enter__(self):
+        self.metrics = current_request.get()
+        if self.metrics is not None:
+            self.metrics.enter(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.metrics is not None:
+            self.metrics.exit()
+
+
+def timed_iter(iterable, name):
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def start_request():
+    if not ENABLED:
+        return None
+    request_metrics = RequestMetrics()
+    current_request.set(request_metrics)
+    return request_metrics
+
+
+def record_status(status):
+    request_metrics = current_request.get()
+    if request_metrics is not None:
+        request_metrics.status = status
+
+
+def record_query(event):
+    # a peewee query hook
+    request_metrics = current_request.get()
+    if request_metrics is not None:
+        request_metrics.add_query(event.duration)
+
+
+def record_cache(result):
+    if current_request.get() is not None:
+        cache_lookups.inc(result)
+
+
+def finish_request(route):
+    request_metrics = current_request.get()
+    if request_metrics is None:
+        return None
+    current_request.set(None)
+    total = time.perf_counter() - request_metrics.started
+
+    # an exception raised past the view never reached after_request; the server answers it with a 500
+    status = 500 if request_metrics.status is None else request_metrics.status
+    request_seconds.observe(total, route, status)
+    request_queries.observe(request_metrics.queries, route)
+    for name, seconds in request_metrics.phases.items():
+        phase_seconds.observe(seconds, route, name)
+
+    if total >= SLOW_REQUEST_SECONDS:
+        breakdown = ", ".join("{}={:.1f}ms".format(name, seconds * 1000)
+                              for name, seconds in sorted(request_metrics.phases.items(), key=lambda item: -item[1]))
+        logger.warning("slow request %s took %.1fms with %d queries: %s", route, total * 1000,
+                       request_metrics.queries, breakdown)
+    return total
+
+
+def render_metrics():
+    return registry.render()
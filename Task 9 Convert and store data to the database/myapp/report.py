@@ -1,100 +1,276 @@
+import bz2
+import collections
 import datetime
+import gzip
+import logging
+import operator
+import os
 import pathlib
+import sys
 
+from myapp.logcache import log_cache
 
 BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
 START_DATA_FILE = BASE_DIR / 'data' / 'start.log'
 FINISH_DATA_FILE = BASE_DIR / 'data' / 'end.log'
 ABBREVIATIONS_FILE = BASE_DIR / 'data' / 'abbreviations.txt'
 
+logger = logging.getLogger(__name__)
+
+# immutable records used through the whole pipeline; plain tuples underneath, so no per-instance __dict__
+Racer = collections.namedtuple("Racer", ["abbreviation", "name", "car"])
+TimeRecord = collections.namedtuple("TimeRecord", ["abbreviation", "date", "time"])
+LapTime = collections.namedtuple("LapTime", ["abbreviation", "start_time", "end_time", "delta_time"])
+Result = collections.namedtuple("Result", ["abbreviation", "name", "car", "start_time", "end_time", "delta_time"])
+
+
+def open_log(file):
+    suffix = pathlib.Path(file).suffix
+    if suffix == ".gz":
+        return gzip.open(file, "rt", encoding="utf-8")
+    elif suffix == ".bz2":
+        return bz2.open(file, "rt", encoding="utf-8")
+    return open(file, "r", encoding="utf-8")
+
+
+def iter_lines(file):
+    if hasattr(file, "read"):
+        stream = file
+    else:
+        stream = open_log(file)
+
+    try:
+        for line in stream:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            line = line.rstrip("\r\n")
+            if line:
+                yield line
+    finally:
+        if stream is not file:
+            stream.close()
+
+
+def iter_abbreviations(lines):
+    # names, teams and codes repeat across sessions and races, interning keeps one copy of each
+    intern = sys.intern
+    for line in lines:
+        abb, name, car = line.split("_", 2)
+        yield Racer(intern(abb), intern(name), intern(car))
+
+
+def iter_time_records(lines):
+    intern = sys.intern
+    for line in lines:
+        stamp, time = line.split("_", 1)
+        yield TimeRecord(intern(stamp[:3]), intern(stamp[3:]), time)
+
 
 def read_data_from_file(file):
-    with open(file, "r") as f:
-        content = f.read().splitlines()
-    return content
+    return list(iter_lines(file))
 
 
 def abbreviation_file_list(content):
-    abbreviations = []
-    for line in content:
-        sep_data = line.split("_")
-        abbreviations.append(sep_data)
-    return abbreviations
+    return list(iter_abbreviations(content))
 
 
 def time_file_list(content):
-    formatted_lines = []
-    for line in content:
-        sep_data = line.split("_")
-        abb = sep_data[0][:3]
-        start_date = sep_data[0][3:]
-        start_time = sep_data[1]
-        obj = [abb, start_date, start_time]
-        formatted_lines.append(obj)
-    return formatted_lines
-
-
-def count_time(starts, finishes):
-    delta_times = []
-    for start_line in starts:
-        for finish_line in finishes:
-            if finish_line[0] == start_line[0]:
-                format = "%I:%M:%S.%f"
-                t1 = datetime.datetime.strptime(start_line[2], format)
-                t2 = datetime.datetime.strptime(finish_line[2], format)
-                time = t2 - t1
-                line = [start_line[0], start_line[2], finish_line[2], time]
-                delta_times.append(line)
-                break
-    return delta_times
-
-
-def built_report(delta_times, racers, order, driver_id):
-    for time in delta_times:
-        for racer in racers:
-            if racer[0] == time[0]:
-                racer.extend(time[1:4])
-                break
+    return list(iter_time_records(content))
+
+
+def parse_timestamp_ms(value):
+    hours, minutes, rest = value.split(":")
+    seconds, _, fraction = rest.partition(".")
+    if not (hours.isdigit() and minutes.isdigit() and seconds.isdigit() and fraction.isdigit()
+            and len(fraction) <= 6):
+        raise ValueError("time data {!r} does not match format 'HH:MM:SS.mmm'".format(value))
+
+    hour = int(hours)
+    minute = int(minutes)
+    second = int(seconds)
+    if not (1 <= hour <= 12 and minute < 60 and second < 60):
+        raise ValueError("time data {!r} is out of range".format(value))
+
+    # %I semantics: 12 o'clock is hour 0, so 12:xx -> 1:xx is a positive delta
+    return (((hour % 12) * 60 + minute) * 60 + second) * 1000 + int(fraction[:3].ljust(3, "0"))
+
+
+def parse_timestamps_ms(values):
+    import numpy as np
+
+    strings = np.asarray(values, dtype=str).ravel()
+    if strings.size == 0:
+        return np.empty(0, dtype=np.int64)
+    lengths = np.char.str_len(strings)
+    if lengths.max() > 12 or lengths.min() < 11:
+        raise ValueError("time data does not match format 'HH:MM:SS.mmm'")
+
+    padded = np.char.rjust(strings, 12, "0").astype("S12")
+    digits = np.frombuffer(padded.tobytes(), dtype=np.uint8).reshape(-1, 12).astype(np.int64) - ord("0")
+
+    separators = digits[:, [2, 5, 8]]
+    numbers = digits[:, [0, 1, 3, 4, 6, 7, 9, 10, 11]]
+    if ((separators != [ord(":") - ord("0"), ord(":") - ord("0"), ord(".") - ord("0")]).any()
+            or (numbers < 0).any() or (numbers > 9).any()):
+        raise ValueError("time data does not match format 'HH:MM:SS.mmm'")
+
+    hour = digits[:, 0] * 10 + digits[:, 1]
+    minute = digits[:, 3] * 10 + digits[:, 4]
+    second = digits[:, 6] * 10 + digits[:, 7]
+    millisecond = digits[:, 9] * 100 + digits[:, 10] * 10 + digits[:, 11]
+    if (hour < 1).any() or (hour > 12).any() or (minute > 59).any() or (second > 59).any():
+        raise ValueError("time data is out of range")
+
+    return (((hour % 12) * 60 + minute) * 60 + second) * 1000 + millisecond
+
+
+def format_timestamp_ms(value):
+    seconds, millisecond = divmod(value, 1000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return "{}:{:02d}:{:02d}.{:03d}".format(hour % 12 or 12, minute, second, millisecond)
+
+
+def parse_delta_ms(value):
+    days = 0
+    if "day" in value:
+        day_part, value = value.split(", ")
+        days = int(day_part.split()[0])
+    hours, minutes, rest = value.split(":")
+    seconds, _, fraction = rest.partition(".")
+    return (((days * 24 + int(hours)) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction[:3].ljust(3, "0"))
+
+
+def format_delta_ms(value):
+    return str(datetime.timedelta(milliseconds=value))
+
+
+def new_join_issues():
+    return {
+        "duplicate_start": [],
+        "duplicate_finish": [],
+        "duplicate_abbreviation": [],
+        "no_finish": [],
+        "no_start": [],
+        "no_abbreviation": [],
+        "no_time": [],
+    }
+
+
+def index_records(records, duplicates=None):
+    index = {}
+    for record in records:
+        key = record[0]
+        if key in index:
+            if duplicates is not None:
+                duplicates.append(key)
+        else:
+            index[key] = record
+    return index
+
+
+def iter_count_time(starts, finishes, issues=None):
+    if issues is None:
+        issues = new_join_issues()
+
+    finish_index = index_records(finishes, issues["duplicate_finish"])
+    matched = set()
+    for abb, _, start in starts:
+        if abb in matched:
+            issues["duplicate_start"].append(abb)
+            continue
+        finish_line = finish_index.get(abb)
+        if finish_line is None:
+            issues["no_finish"].append(abb)
+            continue
+        matched.add(abb)
+        _, _, end = finish_line
+        time = datetime.timedelta(milliseconds=parse_timestamp_ms(end) - parse_timestamp_ms(start))
+        yield LapTime(abb, start, end, time)
+
+    issues["no_start"].extend(abb for abb in finish_index if abb not in matched)
+
+
+def count_time(starts, finishes, issues=None):
+    return list(iter_count_time(starts, finishes, issues))
+
+
+def built_report(delta_times, racers, order, driver_id, issues=None):
+    if issues is None:
+        issues = new_join_issues()
+
+    times = index_records(delta_times)
+    seen = set()
+    racers_timed = []
+    for abb, name, car in racers:
+        if abb in seen:
+            issues["duplicate_abbreviation"].append(abb)
+            continue
+        seen.add(abb)
+        time = times.pop(abb, None)
+        if time is None:
+            issues["no_time"].append(abb)
+            continue
+        _, start, end, delta = time
+        racers_timed.append(Result(abb, name, car, start, end, delta))
+
+    issues["no_abbreviation"].extend(times)
 
     racers_sorted = []
 
     if driver_id != "":
-        for racer in racers:
-            if racer[0] == driver_id:
+        for racer in racers_timed:
+            if racer.abbreviation == driver_id:
                 return [racer]
     elif order == "desc":
-        racers_sorted = sorted(racers, key=lambda x: - x[5])
+        racers_sorted = sorted(racers_timed, key=operator.attrgetter("delta_time"), reverse=True)
     else:
-        racers_sorted = sorted(racers, key=lambda x: x[5])
+        racers_sorted = sorted(racers_timed, key=operator.attrgetter("delta_time"))
 
     return racers_sorted
 
 
-def drivers_statistic(racers_sorted):
-    statistic = []
+def log_join_issues(issues):
+    for kind, abbreviations in issues.items():
+        if abbreviations:
+            logger.warning("%s: %s", kind.replace("_", " "), ", ".join(abbreviations))
+
+
+def iter_drivers_statistic(racers_sorted):
     for driver in racers_sorted:
-        info_dict = dict(id=driver[0], name=driver[1], car=driver[2], start_time=driver[3], end_time=driver[4],
-                 delta_time=driver[5])
-        statistic.append(info_dict)
-    return statistic
+        yield dict(id=driver.abbreviation, name=driver.name, car=driver.car, start_time=driver.start_time,
+                   end_time=driver.end_time, delta_time=driver.delta_time)
+
 
+def drivers_statistic(racers_sorted):
+    return list(iter_drivers_statistic(racers_sorted))
 
-def ordering(order, driver_id):
-    start_data = read_data_from_file(START_DATA_FILE)
-    start_data_parsed = time_file_list(start_data)
 
-    finish_data = read_data_from_file(FINISH_DATA_FILE)
-    finish_data_parsed = time_file_list(finish_data)
+def join_logs(start_file=START_DATA_FILE, finish_file=FINISH_DATA_FILE, abbreviations_file=ABBREVIATIONS_FILE,
+              order="asc", driver_id=""):
+    issues = new_join_issues()
 
-    time_parsed = count_time(start_data_parsed, finish_data_parsed)
+    starts = iter_time_records(iter_lines(start_file))
+    finishes = iter_time_records(iter_lines(finish_file))
+    time_parsed = iter_count_time(starts, finishes, issues)
 
-    abbreviations = read_data_from_file(ABBREVIATIONS_FILE)
-    abbreviations_parsed = abbreviation_file_list(abbreviations)
+    racers = iter_abbreviations(iter_lines(abbreviations_file))
 
-    report = built_report(time_parsed, abbreviations_parsed, order, driver_id)
-    final_statistic = drivers_statistic(report)
+    report = built_report(time_parsed, racers, order, driver_id, issues)
+    log_join_issues(issues)
+    return report
 
-    return final_statistic
 
+def iter_ordering(order, driver_id, start_file=START_DATA_FILE, finish_file=FINISH_DATA_FILE,
+                  abbreviations_file=ABBREVIATIONS_FILE):
+    files = (start_file, finish_file, abbreviations_file)
+    if all(isinstance(file, (str, os.PathLike)) for file in files):
+        # unchanged logs are parsed and joined once, later calls read the cached results
+        return log_cache.load(files, join_logs).iter_results(order, driver_id)
+    # file objects have nothing to key a cache entry on
+    return iter_drivers_statistic(join_logs(*files, order, driver_id))
 
 
+def ordering(order, driver_id, start_file=START_DATA_FILE, finish_file=FINISH_DATA_FILE,
+             abbreviations_file=ABBREVIATIONS_FILE):
+    return list(iter_ordering(order, driver_id, start_file, finish_file, abbreviations_file))
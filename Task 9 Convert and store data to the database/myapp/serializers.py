@@ -0,0 +1,79 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# "json" keeps the historical wire format byte for byte; "orjson" is faster but emits compact separators
+JSON_BACKEND = os.environ.get("REPORT_JSON_BACKEND", "json")
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" ?>'
+XML_ROOT = "full_report"
+XML_ITEM = "driver"
+XML_CHUNK_ROWS = 256
+
+
+def dumps_json(report, backend=None):
+    backend = backend or JSON_BACKEND
+    if backend == "orjson" and orjson is not None:
+        return orjson.dumps(report, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(report) + "\n").encode("utf-8")
+
+
+def escape_xml(value):
+    return (value.replace("&", "&amp;").replace('"', "&quot;").replace("'", "&apos;")
+            .replace("<", "&lt;").replace(">", "&gt;"))
+
+
+def xml_text(value):
+    if value is None:
+        return ""
+    if value is True or value is False:
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return escape_xml(value)
+    return str(value)
+
+
+def xml_row(row):
+    parts = ["<", XML_ITEM, ">"]
+    for key, value in row.items():
+        parts += ("<", key, ">", xml_text(value), "</", key, ">")
+    parts += ("</", XML_ITEM, ">")
+    return "".join(parts)
+
+
+def iter_xml(report):
+    # same document shape as dicttoxml(report, attr_type=False, custom_root="full_report",
+    # item_func=lambda x: "driver"), written incrementally
+    if report is None:
+        yield "{}<{root}><{item}></{item}></{root}>".format(XML_DECLARATION, root=XML_ROOT,
+                                                            item=XML_ITEM).encode("utf-8")
+        return
+
+    head = [XML_DECLARATION, "<", XML_ROOT, ">"]
+    for key, value in report.items():
+        if isinstance(value, (str, int, float)) or value is None:
+            head += ("<", key, ">", xml_text(value), "</", key, ">")
+            continue
+
+        head += ("<", key, ">")
+        chunk = ["".join(head)]
+        for row in value:
+            chunk.append(xml_row(row))
+            if len(chunk) >= XML_CHUNK_ROWS:
+                yield "".join(chunk).encode("utf-8")
+                chunk = []
+        chunk.append("</{}>".format(key))
+        yield "".join(chunk).encode("utf-8")
+        head = []
+
+    head += ("</", XML_ROOT, ">")
+    yield "".join(head).encode("utf-8")
+
+
+def dumps_xml(report):
+    return b"".join(iter_xml(report))
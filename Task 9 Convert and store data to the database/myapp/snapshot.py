@@ -0,0 +1,200 @@
+import collections
+import datetime
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+
+from myapp.report import format_timestamp_ms, format_delta_ms
+from myapp.board import Board, encode_board
+from myapp.create_tables import (Race, Driver, DatasetVersion, OperationalError, DEFAULT_RACE_ID, DEFAULT_RACE_NAME,
+                                 DEFAULT_RACE_TITLE, get_dataset_version)
+
+# when set, ingest writes the snapshot here and every worker process maps the same file
+SNAPSHOT_PATH = os.environ.get("REPORT_SNAPSHOT_PATH")
+SNAPSHOT_MAGIC = b"LBS1"
+HEADER = struct.Struct("=4sI")
+
+logger = logging.getLogger(__name__)
+
+RaceInfo = collections.namedtuple("RaceInfo", ["id", "name", "title"])
+
+
+class Snapshot:
+    def __init__(self, buffer):
+        self.buffer = buffer
+        magic, length = HEADER.unpack_from(buffer, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("not a leaderboard snapshot")
+        header = json.loads(bytes(buffer[HEADER.size:HEADER.size + length]))
+        base = HEADER.size + length
+
+        self.version = DatasetVersion(id=1, version=header["version"],
+                                      updated_at=datetime.datetime.fromisoformat(header["updated_at"]))
+        self.races = {}
+        self.boards = {}
+        for race_id, name, title, offset in header["races"]:
+            self.races[name] = RaceInfo(race_id, name, title)
+            self.boards[race_id] = Board(buffer, base + offset)
+        self.races_by_id = {race.id: race for race in self.races.values()}
+
+    @property
+    def stamp(self):
+        return self.version.stamp
+
+    def race(self, name):
+        return self.races.get(name)
+
+    def board(self, race_id):
+        return self.boards.get(race_id)
+
+
+def encode_snapshot(previous=None, changed=()):
+    # with a previous snapshot, only the changed races and those it lacks are read and encoded again
+    database = Driver._meta.database
+    stale = None
+    try:
+        with database.atomic():
+            dataset_version = get_dataset_version()
+            if dataset_version is None:
+                return None
+            try:
+                races = list(Race.select(Race.id, Race.name, Race.title).order_by(Race.id).tuples())
+            except OperationalError:
+                # databases from before the Races table hold the default race only
+                races = [(DEFAULT_RACE_ID, DEFAULT_RACE_NAME, DEFAULT_RACE_TITLE)]
+            query = (Driver
+                     .select(Driver.race, Driver.id, Driver.name, Driver.car, Driver.start_time, Driver.end_time,
+                             Driver.delta_time)
+                     .order_by(Driver.race, Driver.delta_time, Driver.id))
+            if previous is not None:
+                stale = set(changed) | {race_id for race_id, _, _ in races if previous.board(race_id) is None}
+                query = query.where(Driver.race.in_(sorted(stale)))
+            rows = collections.defaultdict(list)
+            # raw cursor: times stay integers, formatted once here instead of on every read
+            for race_id, driver_id, name, car, start, end, lap in database.execute(query):
+                rows[race_id].append((driver_id, name, car, format_timestamp_ms(start), format_timestamp_ms(end),
+                                      format_delta_ms(lap), lap))
+    except OperationalError:
+        return None
+
+    header = {"version": dataset_version.version, "updated_at": dataset_version.updated_at.isoformat(), "races": []}
+    boards = []
+    offset = 0
+    for race_id, name, title in races:
+        if stale is None or race_id in stale:
+            board = encode_board(rows.get(race_id, []))
+        else:
+            board = previous.board(race_id).encoded
+        header["races"].append([race_id, name, title, offset])
+        boards.append(board)
+        offset += len(board)
+
+    encoded = json.dumps(header).encode("utf-8")
+    return HEADER.pack(SNAPSHOT_MAGIC, len(encoded)) + encoded + b"".join(boards)
+
+
+def write_snapshot(buffer, path):
+    # written beside the target and renamed over it, so readers map either the old or the new file
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "wb") as stream:
+        stream.write(buffer)
+    os.replace(temporary, path)
+
+
+def map_snapshot(path):
+    with open(path, "rb") as stream:
+        buffer = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    return Snapshot(buffer)
+
+
+current = None
+current_file = None
+swap_lock = threading.Lock()
+# the thread building a snapshot for a newer dataset version, off the request path
+rebuilding = None
+
+
+def publish_snapshot(path=SNAPSHOT_PATH, changed=(), since=None):
+    # changed: the races written since dataset version `since`. A snapshot built at exactly that version still has
+    # every other board right, so those are copied from it; anything else is encoded in full
+    global current
+    previous = None
+    if since is not None:
+        previous = current_snapshot(path) if path else current
+        if previous is not None and previous.stamp != since.stamp:
+            previous = None
+    buffer = encode_snapshot(previous, changed)
+    if buffer is None:
+        return None
+    if path:
+        write_snapshot(buffer, path)
+    snapshot = current = Snapshot(buffer)
+    return snapshot
+
+
+def current_snapshot(path=SNAPSHOT_PATH):
+    global current, current_file
+    if path:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity != current_file:
+            with swap_lock:
+                if identity != current_file:
+                    current = map_snapshot(path)
+                    current_file = identity
+        return current
+
+    dataset_version = get_dataset_version()
+    if dataset_version is None:
+        return None
+    snapshot = current
+    if snapshot is None:
+        # the first request of the process builds it
+        with swap_lock:
+            snapshot = current
+            if snapshot is None:
+                snapshot = publish_snapshot(path=None)
+        return snapshot
+    if snapshot.stamp != dataset_version.stamp:
+        # a live follower bumps the version on every poll; until the rebuild is done, requests read the tables
+        start_rebuild(dataset_version.stamp)
+        return None
+    return snapshot
+
+
+def clear_snapshot():
+    global current, current_file, rebuilding
+    if rebuilding is not None:
+        rebuilding.join()
+    with swap_lock:
+        current = current_file = rebuilding = None
+
+
+def rebuild_snapshot():
+    try:
+        publish_snapshot(path=None)
+    except Exception:
+        logger.exception("snapshot rebuild failed")
+    finally:
+        # connections opened by this thread go back to the pool
+        for database in {model._meta.database for model in (Race, Driver, DatasetVersion)}:
+            if not database.is_closed():
+                database.close()
+
+
+def start_rebuild(stamp):
+    global rebuilding
+    with swap_lock:
+        # one at a time, and once per version; a later version starts its own when this one is done
+        if rebuilding is not None and (rebuilding.is_alive() or rebuilding.stamp == stamp):
+            return rebuilding
+        rebuilding = threading.Thread(target=rebuild_snapshot, name="snapshot-rebuild", daemon=True)
+        rebuilding.stamp = stamp
+        rebuilding.start()
+    return rebuilding
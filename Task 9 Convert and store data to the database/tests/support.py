@@ -0,0 +1,49 @@
+from myapp import *
+from myapp.snapshot import clear_snapshot
+from functools import wraps
+import pathlib
+import tempfile
+import unittest
+
+MODELS = (BaseModel, Race, Driver, DatasetVersion, RaceSource)
+
+
+def use_test_db(method):
+    @wraps(method)
+    def inner(self):
+        test_db = SqliteDatabase(':memory:')
+        with test_db.bind_ctx(MODELS):
+            test_db.create_tables(MODELS)
+            try:
+                method(self)
+            finally:
+                test_db.drop_tables(MODELS)
+    return inner
+
+
+class DatabaseTestCase(unittest.TestCase):
+    # every test starts from empty tables for MODELS, an empty response cache and no snapshot
+    MODELS = MODELS
+    # threads and worker processes need to see the same database, which an in-memory one is not
+    ON_DISK = False
+
+    def setUp(self):
+        app.testing = True
+        self.client = app.test_client()
+        response_cache.clear()
+        clear_snapshot()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tmp.name)
+        path = str(self.directory / DATABASE) if self.ON_DISK else ':memory:'
+        self.test_db = SqliteDatabase(path, check_same_thread=False)
+        self.ctx = self.test_db.bind_ctx(self.MODELS)
+        self.ctx.__enter__()
+        self.test_db.create_tables(self.MODELS)
+
+    def tearDown(self):
+        clear_snapshot()
+        self.test_db.drop_tables(self.MODELS)
+        self.test_db.close()
+        self.ctx.__exit__(None, None, None)
+        self.tmp.cleanup()
+        self.client = None
@@ -1,23 +1,10 @@
 from myapp import *
-from functools import wraps
+from myapp.cache import zstandard
+import gzip
 import unittest
 import xml.etree.ElementTree as ET
-
-MODELS = (BaseModel, Driver)
-
-
-def use_test_db(method):
-    @wraps(method)
-    def inner(self):
-        test_db = SqliteDatabase(':memory:')
-        with test_db.bind_ctx(MODELS):
-            test_db.create_tables(MODELS)
-            try:
-                method(self)
-            finally:
-                test_db.drop_tables(MODELS)
-
-    return inner
+from playhouse.test_utils import count_queries
+from support import DatabaseTestCase, use_test_db
 
 
 class TestWeb(unittest.TestCase):
@@ -428,5 +415,309 @@ class TestWeb(unittest.TestCase):
         self.client = None
 
 
+class TestResponseCache(DatabaseTestCase):
+    MODELS = (BaseModel, Driver, DatasetVersion)
+
+    def setUp(self):
+        super().setUp()
+        bulk_insert_into_driver_table([
+            {'id': 'LHM', 'name': 'Lewis Hamilton', 'car': 'MERCEDES', 'start_time': '12:18:20.125',
+             'end_time': '1:11:32.585', 'delta_time': '0:53:12.460000'},
+            {'id': 'SSW', 'name': 'Sergey Sirotkin', 'car': 'WILLIAMS MERCEDES', 'start_time': '12:16:11.648',
+             'end_time': '1:11:24.354', 'delta_time': '0:55:12.706000'}
+        ])
+
+    def test_cached_until_ingest(self):
+        first = self.client.get("/api/v1.0/report", query_string={"format": "xml"})
+        first_streamed = first.is_streamed
+        first_body = first.data
+        with count_queries() as counter:
+            second = self.client.get("/api/v1.0/report", query_string={"format": "xml"})
+
+        bulk_insert_into_driver_table([
+            {'id': 'EOF', 'name': 'Esteban Ocon', 'car': 'FORCE INDIA MERCEDES', 'start_time': '12:17:58.810',
+             'end_time': '1:12:11.838', 'delta_time': '0:54:13.028000'}
+        ])
+        third = self.client.get("/api/v1.0/report", query_string={"format": "xml"})
+
+        with self.subTest():
+            self.assertTrue(first_streamed)
+            self.assertEqual(first_body, second.data)
+            self.assertEqual(counter.count, 1)
+            self.assertIn("ETag", second.headers)
+            self.assertIn("Last-Modified", second.headers)
+            self.assertIn(b"Esteban Ocon", third.data)
+            self.assertNotIn(b"Esteban Ocon", first_body)
+
+    def test_keyed_on_arguments(self):
+        asc = self.client.get("/api/v1.0/report/drivers/ordered", query_string={"order": "asc", "format": "json"})
+        desc = self.client.get("/api/v1.0/report/drivers/ordered", query_string={"order": "desc", "format": "json"})
+        driver = self.client.get("/api/v1.0/report/drivers/driver", query_string={"driver_id": "SSW",
+                                                                                 "format": "json"})
+
+        with self.subTest():
+            self.assertEqual(asc.json["drivers"][0]["id"], "LHM")
+            self.assertEqual(desc.json["drivers"][0]["id"], "SSW")
+            self.assertEqual(driver.json["drivers"][0]["name"], "Sergey Sirotkin")
+            self.assertEqual(response_cache.hits, 0)
+
+    def test_not_modified(self):
+        first = self.client.get("/api/v1.0/report/drivers", query_string={"format": "json"})
+        second = self.client.get("/api/v1.0/report/drivers", query_string={"format": "json"},
+                                 headers={"If-None-Match": first.headers["ETag"]})
+
+        with self.subTest():
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(second.status_code, 304)
+            self.assertEqual(second.data, b"")
+
+
+class TestPagination(DatabaseTestCase):
+    MODELS = (BaseModel, Driver, DatasetVersion)
+
+    def setUp(self):
+        super().setUp()
+        bulk_insert_into_driver_table([
+            {'id': 'LHM', 'name': 'Lewis Hamilton', 'car': 'MERCEDES', 'start_time': '12:18:20.125',
+             'end_time': '1:11:32.585', 'delta_time': '0:53:12.460000'},
+            {'id': 'SSW', 'name': 'Sergey Sirotkin', 'car': 'WILLIAMS MERCEDES', 'start_time': '12:16:11.648',
+             'end_time': '1:11:24.354', 'delta_time': '0:55:12.706000'},
+            {'id': 'EOF', 'name': 'Esteban Ocon', 'car': 'FORCE INDIA MERCEDES', 'start_time': '12:17:58.810',
+             'end_time': '1:12:11.838', 'delta_time': '0:54:13.028000'},
+            {'id': 'TIE', 'name': 'Tied Driver', 'car': 'MERCEDES', 'start_time': '12:18:20.125',
+             'end_time': '1:11:32.585', 'delta_time': '0:53:12.460000'}
+        ])
+
+    def test_pages_json(self):
+        seen = []
+        query = {"format": "json", "limit": "3"}
+        while True:
+            response = self.client.get("/api/v1.0/report", query_string=query)
+            self.assertEqual(response.json["total"], 4)
+            seen += [driver["id"] for driver in response.json["drivers"]]
+            if response.json["next"] is None:
+                break
+            query["after"] = response.json["next"]
+
+        self.assertEqual(seen, ["LHM", "TIE", "EOF", "SSW"])
+
+    def test_pages_xml(self):
+        first = self.client.get("/api/v1.0/report/drivers", query_string={"format": "xml", "limit": "2"})
+        root = ET.fromstring(first.data)
+        second = self.client.get("/api/v1.0/report/drivers", query_string={"format": "xml", "limit": "2",
+                                                                          "after": root.findtext("next")})
+
+        with self.subTest():
+            self.assertEqual([d.findtext("id") for d in root.iter("driver")], ["LHM", "TIE"])
+            self.assertIsNone(root.find("drivers/driver/delta_time"))
+            self.assertEqual([d.findtext("id") for d in ET.fromstring(second.data).iter("driver")], ["EOF", "SSW"])
+
+    def test_pages_descending(self):
+        response = self.client.get("/api/v1.0/report/drivers/ordered", query_string={
+            "order": "desc", "format": "json", "limit": "2", "after": "3192460:TIE"})
+
+        self.assertEqual([driver["id"] for driver in response.json["drivers"]], ["LHM"])
+        self.assertIsNone(response.json["next"])
+
+    def test_page_served_from_snapshot(self):
+        self.client.get("/api/v1.0/report", query_string={"format": "json", "limit": "1"})
+        with count_queries() as counter:
+            self.client.get("/api/v1.0/report", query_string={"format": "json", "limit": "2"})
+
+        # only the dataset version is read, the page and total come from the leaderboard snapshot
+        self.assertEqual(counter.count, 1)
+
+    def test_invalid_page_arguments(self):
+        for query in ({"limit": "0"}, {"limit": "abc"}, {"limit": "5000"}, {"after": "LHM"},
+                      {"limit": "\u00b2"}, {"after": "\u00b2:LHM"}):
+            with self.subTest(query=query):
+                response = self.client.get("/api/v1.0/report", query_string=dict(query, format="json"))
+                self.assertEqual(response.status_code, 400)
+
+    def test_unpaged_response_unchanged(self):
+        response = self.client.get("/api/v1.0/report", query_string={"format": "json"})
+
+        self.assertNotIn("next", response.json)
+
+
+class TestStandings(DatabaseTestCase):
+    MODELS = (BaseModel, Driver, DatasetVersion)
+
+    def setUp(self):
+        super().setUp()
+        bulk_insert_into_driver_table([
+            {'id': 'SSW', 'name': 'Sergey Sirotkin', 'car': 'WILLIAMS MERCEDES', 'start_time': '12:16:11.648',
+             'end_time': '1:11:24.354', 'delta_time': '0:55:12.706000'},
+            {'id': 'TIE', 'name': 'Tied Driver', 'car': 'MERCEDES', 'start_time': '12:18:20.125',
+             'end_time': '1:11:32.585', 'delta_time': '0:53:12.460000'},
+            {'id': 'EOF', 'name': 'Esteban Ocon', 'car': 'FORCE INDIA MERCEDES', 'start_time': '12:17:58.810',
+             'end_time': '1:12:11.838', 'delta_time': '0:54:13.028000'},
+            {'id': 'LHM', 'name': 'Lewis Hamilton', 'car': 'MERCEDES', 'start_time': '12:18:20.125',
+             'end_time': '1:11:32.585', 'delta_time': '0:53:12.460000'}
+        ])
+
+    def test_standings_json(self):
+        response = self.client.get("/api/v1.0/report/standings", query_string={"format": "json"})
+        drivers = response.json["drivers"]
+
+        with self.subTest():
+            self.assertEqual(response.json["title"], "Monaco Racing 2018 Standings")
+            self.assertEqual([driver["id"] for driver in drivers], ["LHM", "TIE", "EOF", "SSW"])
+            self.assertEqual([driver["position"] for driver in drivers], [1, 1, 3, 4])
+            self.assertEqual([driver["gap"] for driver in drivers], ["0:00:00", "0:00:00", "0:01:00.568000",
+                                                                     "0:02:00.246000"])
+            self.assertEqual([driver["interval"] for driver in drivers], [None, "0:00:00", "0:01:00.568000",
+                                                                          "0:00:59.678000"])
+
+    def test_standings_xml(self):
+        response = self.client.get("/api/v1.0/report/standings", query_string={"format": "xml"})
+        root = ET.fromstring(response.data)
+
+        with self.subTest():
+            self.assertEqual([d.findtext("position") for d in root.iter("driver")], ["1", "1", "3", "4"])
+            self.assertEqual(root.find("drivers/driver/interval").text, None)
+
+    def test_computed_once_per_version(self):
+        self.client.get("/api/v1.0/report/standings", query_string={"format": "json"})
+        with count_queries() as counter:
+            cached = self.client.get("/api/v1.0/report/standings", query_string={"format": "json"})
+        bulk_insert_into_driver_table([
+            {'id': 'LHM', 'name': 'Lewis Hamilton', 'car': 'MERCEDES', 'start_time': '12:18:20.125',
+             'end_time': '1:11:30.585', 'delta_time': '0:53:10.460000'}
+        ])
+        updated = self.client.get("/api/v1.0/report/standings", query_string={"format": "json"})
+
+        with self.subTest():
+            self.assertEqual(counter.count, 1)
+            self.assertEqual(cached.json["drivers"][1]["position"], 1)
+            self.assertEqual(updated.json["drivers"][1]["position"], 2)
+            self.assertEqual(updated.json["drivers"][1]["gap"], "0:00:02")
+
+    def test_window_follows_lap_time_index(self):
+        sql, params = select_standings().sql()
+        plan = [row[3] for row in self.test_db.execute_sql("EXPLAIN QUERY PLAN " + sql, params)]
+
+        with self.subTest():
+            self.assertTrue(any("INDEX driver_race_id_delta_time_id" in step for step in plan))
+            self.assertFalse(any("TEMP B-TREE" in step for step in plan))
+
+    def test_invalid_format(self):
+        response = self.client.get("/api/v1.0/report/standings", query_string={"format": "csv"})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TestRaces(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        Race.create(id=DEFAULT_RACE_ID, name=DEFAULT_RACE_NAME, title=DEFAULT_RACE_TITLE)
+        silverstone = get_or_create_race("silverstone-2018", "Silverstone Racing 2018")
+        bulk_insert_into_driver_table([
+            {'id': 'LHM', 'name': 'Lewis Hamilton', 'car': 'MERCEDES', 'start_time': '12:18:20.125',
+             'end_time': '1:11:32.585', 'delta_time': '0:53:12.460000'},
+            {'id': 'SSW', 'name': 'Sergey Sirotkin', 'car': 'WILLIAMS MERCEDES', 'start_time': '12:16:11.648',
+             'end_time': '1:11:24.354', 'delta_time': '0:55:12.706000'},
+            {'race': silverstone, 'id': 'LHM', 'name': 'Lewis Hamilton', 'car': 'MERCEDES',
+             'start_time': '12:00:00.000', 'end_time': '1:30:00.000', 'delta_time': '1:30:00'}
+        ])
+
+    def test_default_race(self):
+        response = self.client.get("/api/v1.0/report", query_string={"format": "json"})
+
+        with self.subTest():
+            self.assertEqual(response.json["title"], "Monaco Racing 2018")
+            self.assertEqual(response.json["total"], 2)
+
+    def test_race_parameter(self):
+        report = self.client.get("/api/v1.0/report/", query_string={"race": "silverstone-2018", "order": "desc",
+                                                                    "format": "json"})
+        names = self.client.get("/api/v1.0/report/drivers", query_string={"race": "silverstone-2018",
+                                                                          "format": "xml"})
+        driver = self.client.get("/api/v1.0/report/drivers/driver", query_string={"race": "silverstone-2018",
+                                                                                 "driver_id": "SSW",
+                                                                                 "format": "json"})
+        page = self.client.get("/report", query_string={"race": "silverstone-2018"})
+
+        with self.subTest():
+            self.assertEqual(report.json["title"], "Silverstone Racing 2018")
+            self.assertEqual(report.json["total"], 1)
+            self.assertEqual(report.json["drivers"][0]["delta_time"], "1:30:00")
+            self.assertEqual(ET.fromstring(names.data).findtext("title"), "Silverstone Racing 2018 Drivers")
+            self.assertEqual(driver.json["total"], 0)
+            self.assertIn(b'1:30:00', page.data)
+            self.assertNotIn(b'Sergey Sirotkin', page.data)
+
+    def test_page_titles(self):
+        pages = (("/report", {}), ("/report/", {"order": "asc"}), ("/report/drivers", {}),
+                 ("/report/drivers/", {"order": "desc"}), ("/report/drivers/", {"driver_id": "LHM"}))
+        for path, query in pages:
+            with self.subTest(path=path, query=query):
+                default = self.client.get(path, query_string=query)
+                other = self.client.get(path, query_string=dict(query, race="silverstone-2018"))
+                self.assertIn(b"Formula-1 Monaco Racing 2018", default.data)
+                self.assertIn(b"Formula-1 Silverstone Racing 2018", other.data)
+                self.assertNotIn(b"Monaco", other.data)
+
+    def test_unknown_race(self):
+        response = self.client.get("/api/v1.0/report", query_string={"race": "imola-2018", "format": "json"})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TestConditionalCompression(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        insert_into_driver_table()
+
+    def test_negotiated_gzip(self):
+        plain = self.client.get("/api/v1.0/report", query_string={"format": "xml"})
+        plain_body = plain.data
+        compressed = self.client.get("/api/v1.0/report", query_string={"format": "xml"},
+                                     headers={"Accept-Encoding": "gzip;q=1.0, identity;q=0.5"})
+
+        with self.subTest():
+            self.assertEqual(compressed.headers["Content-Encoding"], "gzip")
+            self.assertEqual(compressed.headers["Vary"], "Accept-Encoding")
+            self.assertEqual(gzip.decompress(compressed.data), plain_body)
+            self.assertLess(len(compressed.data), len(plain_body) / 2)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_preferred(self):
+        plain = self.client.get("/api/v1.0/report/drivers", query_string={"format": "json"})
+        compressed = self.client.get("/api/v1.0/report/drivers", query_string={"format": "json"},
+                                     headers={"Accept-Encoding": "gzip, br, zstd"})
+
+        with self.subTest():
+            self.assertEqual(compressed.headers["Content-Encoding"], "zstd")
+            self.assertEqual(zstandard.ZstdDecompressor().decompress(compressed.data), plain.data)
+
+    def test_repeat_poll_skips_cache_and_build(self):
+        first = self.client.get("/api/v1.0/report", query_string={"format": "json"},
+                                headers={"Accept-Encoding": "gzip"})
+        etag = first.headers["ETag"]
+        # another worker never built this body, the version alone proves the client copy current
+        response_cache.clear()
+        with count_queries() as counter:
+            second = self.client.get("/api/v1.0/report", query_string={"format": "json"},
+                                     headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+
+        with self.subTest():
+            self.assertEqual(second.status_code, 304)
+            self.assertEqual(second.headers["ETag"], etag)
+            self.assertEqual(counter.count, 1)
+            self.assertEqual(len(response_cache), 0)
+
+    def test_etag_changes_with_version(self):
+        first = self.client.get("/api/v1.0/report", query_string={"format": "json"})
+        bump_dataset_version()
+        second = self.client.get("/api/v1.0/report", query_string={"format": "json"},
+                                 headers={"If-None-Match": first.headers["ETag"]})
+
+        with self.subTest():
+            self.assertEqual(second.status_code, 200)
+            self.assertNotEqual(second.headers["ETag"], first.headers["ETag"])
+            self.assertFalse(first.headers["ETag"].startswith("W/"))
+
+
 if __name__ == "__main__":
     unittest.main()
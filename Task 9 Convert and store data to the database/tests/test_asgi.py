@@ -0,0 +1,148 @@
+from myapp import *
+from myapp.asgi import application, BODY_QUEUE_CHUNKS
+import asyncio
+import unittest
+from unittest import mock
+from urllib.parse import urlencode
+from support import DatabaseTestCase
+
+
+def asgi_get(path, query_string=None, headers=None):
+    scope = {"type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "path": path,
+             "root_path": "", "query_string": urlencode(query_string or {}).encode(),
+             "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+             "server": ("localhost", 80), "client": ("127.0.0.1", 12345)}
+    sent = []
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # the client stays connected: after the body, receive() waits until it goes away
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    headers = {name.decode(): value.decode() for name, value in sent[0]["headers"]}
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return sent[0]["status"], headers, body
+
+
+class ChunkedApp:
+    # a WSGI app streaming numbered chunks, recording how far it got
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.produced = 0
+        self.closed = False
+
+    def __call__(self, environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return self.generate()
+
+    def generate(self):
+        try:
+            for i in range(self.chunks):
+                self.produced += 1
+                yield b"%d\n" % i
+        finally:
+            self.closed = True
+
+
+class TestAsgiStreaming(unittest.TestCase):
+    scope = {"type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "path": "/", "root_path": "",
+             "query_string": b"", "headers": []}
+
+    def test_slow_client_holds_the_generator_back(self):
+        wsgi = ChunkedApp(200)
+        lags = []
+        disconnect = asyncio.Event()
+
+        async def receive():
+            if not lags:
+                lags.append(0)
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnect.wait()
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message["more_body"]:
+                lags.append(wsgi.produced - int(message["body"]) - 1)
+                await asyncio.sleep(0.001)
+
+        with mock.patch("myapp.asgi.app", wsgi):
+            asyncio.run(application(self.scope, receive, send))
+
+        with self.subTest():
+            self.assertEqual(wsgi.produced, 200)
+            # the queue, one chunk waiting to be queued and one being produced
+            self.assertLessEqual(max(lags), BODY_QUEUE_CHUNKS + 2)
+
+    def test_disconnect_stops_the_generator(self):
+        wsgi = ChunkedApp(100000)
+        sent = []
+        received = []
+        gone = asyncio.Event()
+
+        async def receive():
+            received.append(True)
+            if len(received) == 1:
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 5:
+                gone.set()
+            await asyncio.sleep(0)
+
+        with mock.patch("myapp.asgi.app", wsgi):
+            asyncio.run(application(self.scope, receive, send))
+
+        with self.subTest():
+            self.assertTrue(wsgi.closed)
+            self.assertLess(wsgi.produced, 100)
+            self.assertTrue(all(message.get("more_body", True) for message in sent))
+
+
+class TestAsgi(DatabaseTestCase):
+    # queries run on the executor's threads
+    ON_DISK = True
+
+    def setUp(self):
+        super().setUp()
+        Race.create(id=DEFAULT_RACE_ID, name=DEFAULT_RACE_NAME, title=DEFAULT_RACE_TITLE)
+        insert_into_driver_table()
+
+    def test_same_output_as_wsgi(self):
+        requests = [
+            ("/api/v1.0/report", {"format": "json"}),
+            ("/api/v1.0/report/", {"order": "desc", "format": "xml"}),
+            ("/api/v1.0/report/drivers", {"format": "xml", "limit": 5}),
+            ("/api/v1.0/report/drivers/driver", {"driver_id": "SVF", "format": "json"}),
+            ("/report", {}),
+            ("/report/drivers/", {"driver_id": "SVF"}),
+            ("/api/v1.0/report", {"format": "yaml"}),
+        ]
+        for path, query_string in requests:
+            expected = self.client.get(path, query_string=query_string)
+            status, headers, body = asgi_get(path, query_string)
+            with self.subTest(path=path, query_string=query_string):
+                self.assertEqual(status, expected.status_code)
+                self.assertEqual(headers["content-type"], expected.headers["Content-Type"])
+                self.assertEqual(body, expected.data)
+
+    def test_conditional_request(self):
+        status, headers, body = asgi_get("/api/v1.0/report/drivers", {"format": "json"})
+        second = asgi_get("/api/v1.0/report/drivers", {"format": "json"}, {"If-None-Match": headers["etag"]})
+
+        with self.subTest():
+            self.assertEqual(status, 200)
+            self.assertIn(b"Sebastian Vettel", body)
+            self.assertEqual(second[0], 304)
+            self.assertEqual(second[2], b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
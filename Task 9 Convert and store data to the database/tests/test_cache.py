@@ -0,0 +1,129 @@
+from myapp import *
+from myapp.cache import SharedResponseCache
+import datetime
+import multiprocessing
+import os
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+from support import DatabaseTestCase
+
+
+def serve(directory, path, results):
+    # a worker process of its own: imports the app fresh, with nothing cached in memory
+    os.chdir(directory)
+    from myapp.app import app, response_cache
+
+    response = app.test_client().get(path, headers={"Accept-Encoding": "gzip"})
+    results.put((response.status_code, response.headers.get("Content-Encoding"), response.get_data(),
+                 response_cache.hits, response_cache.misses))
+
+
+class TestSharedResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp.name) / "responses.db"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_shared_between_instances(self):
+        first = SharedResponseCache(self.path)
+        second = SharedResponseCache(self.path)
+        modified = datetime.datetime(2018, 5, 24, 12, 0, 0, 123456)
+        stored = first.set(("report", "json"), "1@2018", b'{"drivers": []}' * 100, "application/json", modified,
+                           ("gzip",))
+        entry = second.get(("report", "json"), "1@2018")
+
+        self.assertEqual(entry, stored)
+        self.assertEqual(entry.last_modified, modified.replace(microsecond=0))
+        self.assertEqual(list(entry.variants), ["gzip"])
+        self.assertEqual((second.hits, second.misses), (1, 0))
+        # a new dataset version misses for everyone
+        self.assertIsNone(second.get(("report", "json"), "2@2018"))
+        self.assertIsNone(first.get(("report", "json"), "2@2018"))
+
+    def test_reuses_a_finished_response(self):
+        first = SharedResponseCache(self.path)
+        second = SharedResponseCache(self.path)
+        stored = first.set("key", "1", b"body" * 100, "text/plain", encodings=("gzip",))
+        with mock.patch("myapp.cache.encode_variants") as encode:
+            self.assertEqual(second.set("key", "1", b"body" * 100, "text/plain", encodings=("gzip",)), stored)
+        encode.assert_not_called()
+
+    def test_evicts_other_versions_first(self):
+        cache = SharedResponseCache(self.path, max_entries=2)
+        cache.set("old", "1", b"old", "text/plain")
+        cache.set("a", "2", b"a", "text/plain")
+        cache.set("b", "2", b"b", "text/plain")
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("old", "1"))
+        self.assertIsNotNone(cache.get("a", "2"))
+
+    def test_expired(self):
+        cache = SharedResponseCache(self.path, ttl=-1)
+        cache.set("key", "1", b"body", "text/plain")
+        self.assertIsNone(cache.get("key", "1"))
+
+
+class TestWorkerProcesses(DatabaseTestCase):
+    PATH = "/api/v1.0/report/drivers/ordered?order=desc&format=json"
+    # the workers open the database file the app is configured with, from the directory they run in
+    ON_DISK = True
+
+    def setUp(self):
+        super().setUp()
+        bulk_insert_into_driver_table([
+            {'id': 'LHM', 'name': 'Lewis Hamilton', 'car': 'MERCEDES', 'start_time': '12:18:20.125',
+             'end_time': '1:11:32.585', 'delta_time': '0:53:12.460000'},
+            {'id': 'SSW', 'name': 'Sergey Sirotkin', 'car': 'WILLIAMS MERCEDES', 'start_time': '12:16:11.648',
+             'end_time': '1:11:24.354', 'delta_time': '0:55:12.706000'}
+        ])
+
+        self.context = multiprocessing.get_context("spawn")
+        self.results = self.context.Queue()
+        # read by the workers when they import the app
+        self.env = mock.patch.dict(os.environ, {"REPORT_SHARED_CACHE_PATH": os.path.join(self.directory, "cache.db"),
+                                                "REPORT_METRICS": "0"})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        super().tearDown()
+
+    def run_workers(self, count):
+        workers = [self.context.Process(target=serve, args=(self.directory, self.PATH, self.results))
+                   for _ in range(count)]
+        for worker in workers:
+            worker.start()
+        results = [self.results.get(timeout=60) for _ in workers]
+        for worker in workers:
+            worker.join(timeout=60)
+            self.assertEqual(worker.exitcode, 0)
+        return results
+
+    def test_workers_share_one_cache(self):
+        # the first worker builds the response, the others only read it
+        (status, encoding, body, hits, misses), = self.run_workers(1)
+        others = self.run_workers(3)
+
+        self.assertEqual((status, encoding, hits, misses), (200, "gzip", 0, 1))
+        self.assertEqual([result[2:] for result in others], [(body, 1, 0)] * 3)
+
+        # an ingest bumps the dataset version, which every worker sees at once
+        bulk_insert_into_driver_table([
+            {'id': 'EOF', 'name': 'Esteban Ocon', 'car': 'FORCE INDIA MERCEDES', 'start_time': '12:17:58.810',
+             'end_time': '1:12:11.838', 'delta_time': '0:54:13.028000'}
+        ])
+        (_, _, rebuilt, hits, misses), = self.run_workers(1)
+        after = self.run_workers(2)
+
+        self.assertEqual((hits, misses), (0, 1))
+        self.assertNotEqual(rebuilt, body)
+        self.assertEqual([result[2:] for result in after], [(rebuilt, 1, 0)] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
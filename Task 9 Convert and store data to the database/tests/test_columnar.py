@@ -0,0 +1,89 @@
+from myapp import *
+import tempfile
+import unittest
+import pathlib
+from support import use_test_db
+
+try:
+    from myapp.columnar import ResultsTable
+except ImportError:
+    ResultsTable = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(ResultsTable is None, "numpy is not installed")
+class TestResultsTable(unittest.TestCase):
+    def test_from_logs_matches_report(self):
+        table = ResultsTable.from_logs("monaco-2018")
+        expected = ordering("asc", "")
+        ranked = table.sorted()
+
+        with self.subTest():
+            self.assertEqual(len(table), 19)
+            self.assertEqual(list(ranked.drivers[ranked.driver]), [row["id"] for row in expected])
+            self.assertEqual([format_delta_ms(int(lap)) for lap in ranked.lap_ms],
+                             [format_delta_ms(parse_delta_ms(str(row["delta_time"]))) for row in expected])
+            self.assertEqual(list(ranked.names[ranked.driver][:1]), ["Lewis Hamilton"])
+
+    def test_rank_and_gap_per_race(self):
+        table = ResultsTable.from_rows([
+            ("monaco", "LHM", "Lewis Hamilton", "MERCEDES", 0, 3000, 3000),
+            ("monaco", "SVF", "Sebastian Vettel", "FERRARI", 0, 2000, 2000),
+            ("monaco", "KRF", "Kimi Raikkonen", "FERRARI", 0, 3000, 3000),
+            ("spain", "LHM", "Lewis Hamilton", "MERCEDES", 0, 1500, 1500),
+            ("spain", "SVF", "Sebastian Vettel", "FERRARI", 0, 1600, 1600),
+        ])
+
+        with self.subTest():
+            self.assertEqual(table.rank().tolist(), [2, 1, 2, 1, 2])
+            self.assertEqual(table.gap_to_leader().tolist(), [1000, 0, 1000, 0, 100])
+            self.assertEqual(list(table.drivers[table.driver[table.order()]]), ["SVF", "KRF", "LHM", "LHM", "SVF"])
+            self.assertEqual(list(table.drivers[table.driver[table.order(descending=True)]]),
+                             ["LHM", "KRF", "SVF", "SVF", "LHM"])
+
+    def test_team_summary(self):
+        table = ResultsTable.concat([ResultsTable.from_logs("monaco"), ResultsTable.from_logs("again")])
+        summary = table.team_summary()
+        ferrari = list(summary["car"]).index("FERRARI")
+
+        with self.subTest():
+            self.assertEqual(len(table.races), 2)
+            self.assertEqual(int(summary["results"][ferrari]), 4)
+            self.assertEqual(format_delta_ms(int(summary["best_ms"][ferrari])), "1:01:04.415000")
+            self.assertEqual(int(summary["results"].sum()), 38)
+
+    @use_test_db
+    def test_from_database(self):
+        Race.create(id=DEFAULT_RACE_ID, name=DEFAULT_RACE_NAME, title=DEFAULT_RACE_TITLE)
+        insert_into_driver_table()
+        table = ResultsTable.from_database()
+
+        logs = ResultsTable.from_logs(DEFAULT_RACE_NAME)
+        with self.subTest():
+            self.assertEqual(list(table.races), [DEFAULT_RACE_NAME])
+            self.assertEqual(sorted(table.lap_ms.tolist()), sorted(logs.lap_ms.tolist()))
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_export(self):
+        import pyarrow.feather
+        import pyarrow.parquet
+
+        table = ResultsTable.from_logs("monaco-2018")
+        with tempfile.TemporaryDirectory() as tmp:
+            table.to_parquet(pathlib.Path(tmp) / "results.parquet")
+            table.to_feather(pathlib.Path(tmp) / "results.feather")
+            parquet = pyarrow.parquet.read_table(pathlib.Path(tmp) / "results.parquet")
+            feather = pyarrow.feather.read_table(pathlib.Path(tmp) / "results.feather")
+
+        with self.subTest():
+            self.assertEqual(parquet.num_rows, 19)
+            self.assertEqual(feather.column("lap_ms").to_pylist(), table.lap_ms.tolist())
+            self.assertEqual(min(parquet.column("position").to_pylist()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
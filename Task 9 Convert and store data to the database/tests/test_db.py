@@ -1,22 +1,9 @@
 from myapp import *
-from functools import wraps
+import pathlib
+import tempfile
 import unittest
 from playhouse.test_utils import count_queries
-
-MODELS = (BaseModel, Driver)
-
-
-def use_test_db(method):
-    @wraps(method)
-    def inner(self):
-        test_db = SqliteDatabase(':memory:')
-        with test_db.bind_ctx(MODELS):
-            test_db.create_tables(MODELS)
-            try:
-                method(self)
-            finally:
-                test_db.drop_tables(MODELS)
-    return inner
+from support import MODELS, use_test_db
 
 
 class TestModels(unittest.TestCase):
@@ -53,6 +40,124 @@ class TestModels(unittest.TestCase):
                 driver_name = Driver.get(Driver.name == "Esteban Ocon")
             self.assertEqual(counter.count, 1)
 
+    @use_test_db
+    def test_times_stored_as_milliseconds(self):
+        data = [
+            {'id': 'LHM', 'name': 'Lewis Hamilton', 'car': 'MERCEDES', 'start_time': '12:18:20.125',
+             'end_time': '1:11:32.585', 'delta_time': '0:53:12.460000'},
+            {'id': 'SLW', 'name': 'Slow Driver', 'car': 'WILLIAMS MERCEDES', 'start_time': '12:00:00.000',
+             'end_time': '10:00:00.000', 'delta_time': '10:00:00'},
+            {'id': 'EOF', 'name': 'Esteban Ocon', 'car': 'FORCE INDIA MERCEDES', 'start_time': '12:17:58.810',
+             'end_time': '9:17:58.810', 'delta_time': '9:00:00'}
+        ]
+        Driver.insert_many(data).execute()
+
+        raw = Driver.select(Driver.start_time, Driver.delta_time).where(Driver.id == "LHM").tuples()
+        raw_values = Driver._meta.database.execute_sql(
+            'SELECT start_time, delta_time FROM "Drivers_Results" WHERE id = ?', ("LHM",)).fetchone()
+        ordered = [d.id for d in Driver.select().order_by(Driver.delta_time.desc())]
+
+        with self.subTest():
+            self.assertEqual(raw_values, (1100125, 3192460))
+            self.assertEqual(raw.get(), ("12:18:20.125", "0:53:12.460000"))
+            self.assertEqual(ordered, ["SLW", "EOF", "LHM"])
+            self.assertIn("driver_race_id_delta_time_id",
+                          [index.name for index in Driver._meta.database.get_indexes("Drivers_Results")])
+
+    @use_test_db
+    def test_bulk_insert_into_driver_table(self):
+        data = [
+            {'id': 'LHM', 'name': 'Lewis Hamilton', 'car': 'MERCEDES', 'start_time': '12:18:20.125',
+             'end_time': '1:11:32.585', 'delta_time': '0:53:12.460000'},
+            {'id': 'SSW', 'name': 'Sergey Sirotkin', 'car': 'WILLIAMS MERCEDES', 'start_time': '12:16:11.648',
+             'end_time': '1:11:24.354', 'delta_time': '0:55:12.706000'},
+            {'id': 'EOF', 'name': 'Esteban Ocon', 'car': 'FORCE INDIA MERCEDES', 'start_time': '12:17:58.810',
+             'end_time': '1:12:11.838', 'delta_time': '0:54:13.028000'}
+        ]
+
+        stats = bulk_insert_into_driver_table(iter(data), batch_size=2)
+        data[0]['delta_time'] = '0:50:00'
+        bulk_insert_into_driver_table(data)
+
+        with self.subTest():
+            self.assertEqual(stats["rows"], 3)
+            self.assertGreater(stats["rows_per_sec"], 0)
+            self.assertEqual(Driver.select().count(), 3)
+            self.assertEqual(Driver.get(Driver.id == "LHM").delta_time, "0:50:00")
+
+    @use_test_db
+    def test_insert_into_driver_table_is_idempotent(self):
+        insert_into_driver_table()
+        version = get_dataset_version()
+        stats = insert_into_driver_table()
+
+        with self.subTest():
+            self.assertTrue(stats["skipped"])
+            self.assertEqual(stats["rows"], 0)
+            self.assertEqual(get_dataset_version(), version)
+            self.assertEqual(Driver.select().count(), 19)
+            self.assertEqual(Driver.select().order_by(Driver.delta_time).first().id, "LHM")
+
+    @use_test_db
+    def test_insert_into_driver_table_adds_race(self):
+        Race.create(id=DEFAULT_RACE_ID, name=DEFAULT_RACE_NAME, title=DEFAULT_RACE_TITLE)
+        insert_into_driver_table()
+        race = get_or_create_race("monaco-2018-rerun", "Monaco Racing 2018 Rerun")
+        stats = insert_into_driver_table(race=race)
+
+        with self.subTest():
+            self.assertEqual(stats["rows"], 19)
+            self.assertEqual(Driver.select().count(), 38)
+            self.assertEqual(race.results.count(), 19)
+            self.assertEqual(get_race().title, "Monaco Racing 2018")
+            self.assertEqual(get_race("monaco-2018-rerun"), race)
+
+    @use_test_db
+    def test_reinsert_drops_missing_drivers(self):
+        Race.create(id=DEFAULT_RACE_ID, name=DEFAULT_RACE_NAME, title=DEFAULT_RACE_TITLE)
+        other = get_or_create_race("monaco-2018-rerun", "Monaco Racing 2018 Rerun")
+        insert_into_driver_table()
+        insert_into_driver_table(race=other)
+        with tempfile.TemporaryDirectory() as tmp:
+            abbreviations = pathlib.Path(tmp) / "abbreviations.txt"
+            lines = ABBREVIATIONS_FILE.read_text(encoding="utf-8").splitlines()
+            abbreviations.write_text("\n".join(line for line in lines if not line.startswith("SVF")),
+                                     encoding="utf-8")
+            stats = insert_into_driver_table(abbreviations_file=abbreviations)
+
+        with self.subTest():
+            self.assertEqual(stats["rows"], 18)
+            self.assertEqual(Driver.select().where(Driver.race == DEFAULT_RACE_ID).count(), 18)
+            self.assertIsNone(Driver.get_or_none((Driver.race == DEFAULT_RACE_ID) & (Driver.id == "SVF")))
+            self.assertEqual(other.results.count(), 19)
+
+    def test_migrate_driver_table(self):
+        test_db = SqliteDatabase(':memory:')
+        test_db.execute_sql('CREATE TABLE "Drivers_Results" ("id" VARCHAR(255) NOT NULL PRIMARY KEY, '
+                            '"name" VARCHAR(255) NOT NULL, "car" VARCHAR(255) NOT NULL, '
+                            '"start_time" VARCHAR(255) NOT NULL, "end_time" VARCHAR(255) NOT NULL, '
+                            '"delta_time" VARCHAR(255) NOT NULL)')
+        test_db.execute_sql('CREATE UNIQUE INDEX "driver_name" ON "Drivers_Results" ("name")')
+        test_db.execute_sql('INSERT INTO "Drivers_Results" VALUES '
+                            "('LHM', 'Lewis Hamilton', 'MERCEDES', '12:18:20.125', '1:11:32.585', '0:53:12.460000'),"
+                            "('SSW', 'Sergey Sirotkin', 'WILLIAMS MERCEDES', '12:16:11.648', '1:11:24.354', "
+                            "'0:55:12.706000')")
+
+        with test_db.bind_ctx(MODELS):
+            self.assertTrue(migrate_driver_table())
+            self.assertFalse(migrate_driver_table())
+
+            columns = {column.name: column.data_type for column in test_db.get_columns("Drivers_Results")}
+            indexes = [index.name for index in test_db.get_indexes("Drivers_Results")]
+            drivers = [(d.id, d.start_time, d.delta_time) for d in Driver.select().order_by(Driver.delta_time)]
+
+        with self.subTest():
+            self.assertEqual(columns["delta_time"], "INTEGER")
+            self.assertIn("driver_race_id_name", indexes)
+            self.assertIn("driver_race_id_delta_time_id", indexes)
+            self.assertEqual(drivers, [("LHM", "12:18:20.125", "0:53:12.460000"),
+                                       ("SSW", "12:16:11.648", "0:55:12.706000")])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,121 @@
+from myapp import *
+from myapp.follow import LogFollower
+from myapp.snapshot import publish_snapshot, map_snapshot
+from myapp.board import encode_board
+from playhouse.test_utils import count_queries
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+from support import DatabaseTestCase
+
+
+class TimingFeed:
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+        for name in ("abbreviations.txt", "start.log", "end.log"):
+            (self.directory / name).touch()
+
+    def write(self, name, text):
+        with open(self.directory / name, "a", newline="") as stream:
+            stream.write(text)
+
+
+class TestFollow(DatabaseTestCase):
+    MODELS = (BaseModel, Race, Driver, DatasetVersion, LogOffset, RaceSource)
+
+    def setUp(self):
+        super().setUp()
+        self.feed = TimingFeed(self.tmp.name)
+        self.feed.write("abbreviations.txt", "LHM_Lewis Hamilton_MERCEDES\nSVF_Sebastian Vettel_FERRARI\n")
+        self.feed.write("start.log", "LHM2018-05-24_12:18:20.125\nSVF2018-05-24_12:02:58.917\n")
+        self.race = Race.create(name="live", title="Live")
+
+    def test_new_finish_lines_are_upserted(self):
+        follower = LogFollower(self.race, self.tmp.name)
+        self.assertEqual(follower.poll(), [])
+        self.assertEqual(Driver.select().count(), 0)
+        self.assertIsNone(get_dataset_version())
+
+        self.feed.write("end.log", "SVF2018-05-24_1:04:03.332\n")
+        self.assertEqual(follower.poll(), ["SVF"])
+        driver = Driver.get(Driver.id == "SVF")
+        self.assertEqual((driver.race.id, driver.end_time, driver.delta_time),
+                         (self.race.id, "1:04:03.332", "1:01:04.415000"))
+        self.assertEqual(get_dataset_version().version, 1)
+
+        self.feed.write("end.log", "LHM2018-05-24_1:11:32.585\n")
+        self.assertEqual(follower.poll(), ["LHM"])
+        self.assertEqual(Driver.select().count(), 2)
+        self.assertEqual(get_dataset_version().version, 2)
+
+    def test_idle_poll_writes_nothing(self):
+        follower = LogFollower(self.race, self.tmp.name)
+        follower.poll()
+        with count_queries() as counter:
+            self.assertEqual(follower.poll(), [])
+        self.assertEqual(counter.count, 0)
+
+    def test_partial_line_waits_for_newline(self):
+        follower = LogFollower(self.race, self.tmp.name)
+        self.feed.write("end.log", "SVF2018-05-24_1:04")
+        self.assertEqual(follower.poll(), [])
+        self.feed.write("end.log", ":03.332\n")
+        self.assertEqual(follower.poll(), ["SVF"])
+        self.assertEqual(Driver.get(Driver.id == "SVF").end_time, "1:04:03.332")
+
+    def test_resumes_from_saved_offsets(self):
+        LogFollower(self.race, self.tmp.name).poll()
+        self.feed.write("end.log", "SVF2018-05-24_1:04:03.332\n")
+        LogFollower(self.race, self.tmp.name).poll()
+        saved = {offset.log: offset.position for offset in LogOffset.select()}
+        self.assertEqual(saved["finish"], len("SVF2018-05-24_1:04:03.332\n"))
+
+        # a restarted follower only sees the new line but still joins it with the earlier start
+        follower = LogFollower(self.race, self.tmp.name)
+        self.feed.write("end.log", "LHM2018-05-24_1:11:32.585\n")
+        self.assertEqual(follower.poll(), ["LHM"])
+        self.assertEqual(Driver.get(Driver.id == "LHM").delta_time, "0:53:12.460000")
+        self.assertEqual(get_dataset_version().version, 2)
+
+    def test_matches_batch_ingest(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            feed = TimingFeed(tmp)
+            follower = LogFollower(self.race, tmp)
+            for name in ("abbreviations.txt", "start.log", "end.log"):
+                for line in (BASE_DIR / 'data' / name).read_text().splitlines():
+                    feed.write(name, line + "\n")
+                    follower.poll()
+
+        batch = Race.create(name="batch", title="Batch")
+        insert_into_driver_table(race=batch.id)
+
+        def results(race):
+            query = Driver.select().where(Driver.race == race).order_by(Driver.id)
+            return [(d.id, d.name, d.car, d.start_time, d.end_time, d.delta_time) for d in query]
+
+        self.assertEqual(len(results(self.race)), 19)
+        self.assertEqual(results(self.race), results(batch))
+
+    def test_snapshot_reencodes_the_followed_race_only(self):
+        path = str(self.directory / "leaderboard.snapshot")
+        other = Race.create(name="batch", title="Batch")
+        insert_into_driver_table(race=other.id)
+        follower = LogFollower(self.race, self.tmp.name)
+        with mock.patch("myapp.follow.SNAPSHOT_PATH", path):
+            publish_snapshot(path)
+            before = bytes(map_snapshot(path).board(other.id).encoded)
+            self.feed.write("end.log", "SVF2018-05-24_1:04:03.332\n")
+            with mock.patch("myapp.snapshot.encode_board", wraps=encode_board) as encode:
+                self.assertEqual(follower.poll(), ["SVF"])
+        published = map_snapshot(path)
+
+        with self.subTest():
+            self.assertEqual(encode.call_count, 1)
+            self.assertEqual(published.stamp, get_dataset_version().stamp)
+            self.assertEqual(published.board(self.race.id).get("SVF", ("delta_time",)),
+                             {"delta_time": "1:01:04.415000"})
+            self.assertEqual(bytes(published.board(other.id).encoded), before)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import pathlib
+import subprocess
+import sys
+import unittest
+
+PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent
+WEB_MODULES = ("flask", "flask_restful", "werkzeug", "jinja2")
+# cumulative -X importtime budgets in milliseconds, several times what a warm run takes, so only a new heavy
+# import at module level trips them
+IMPORT_BUDGETS = {"myapp.report": 80, "myapp.ingest": 200, "myapp.follow": 200}
+
+
+def import_times(module):
+    env = dict(os.environ, PYTHONPATH=str(PROJECT_DIR))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module], env=env, cwd=PROJECT_DIR,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "self [us]" not in line:
+            own, cumulative, name = line[len("import time:"):].split("|")
+            times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+class TestImports(unittest.TestCase):
+    def test_command_line_paths_skip_the_web_stack(self):
+        for module in ("myapp", "myapp.report", "myapp.create_tables", "myapp.ingest", "myapp.follow"):
+            with self.subTest(module=module):
+                imported = import_times(module)
+                self.assertEqual([name for name in WEB_MODULES if name in imported], [])
+                self.assertNotIn("numpy", imported)
+                self.assertNotIn("multiprocessing", imported)
+
+    def test_import_budget(self):
+        for module, budget in IMPORT_BUDGETS.items():
+            with self.subTest(module=module):
+                # best of three, so one slow start on a busy machine does not fail the build
+                best = min(import_times(module)[module] for _ in range(3))
+                self.assertLess(best, budget)
+
+    def test_package_exports_load_on_use(self):
+        script = ("import sys, myapp; assert 'flask' not in sys.modules; "
+                  "from myapp import *; print(type(app).__name__, create_tables.__name__)")
+        env = dict(os.environ, PYTHONPATH=str(PROJECT_DIR))
+        result = subprocess.run([sys.executable, "-c", script], env=env, cwd=PROJECT_DIR, capture_output=True,
+                                text=True, check=True)
+
+        self.assertEqual(result.stdout.split(), ["Flask", "create_tables"])
@@ -0,0 +1,101 @@
+from myapp import *
+from myapp.ingest import discover_races, race_name, parse_race, ingest
+import gzip
+import shutil
+import unittest
+from support import DatabaseTestCase
+
+DATA_DIR = BASE_DIR / 'data'
+
+
+class TestIngest(DatabaseTestCase):
+    MODELS = (BaseModel, Race, Driver, DatasetVersion, RaceSource)
+
+    def setUp(self):
+        super().setUp()
+        self.root = self.directory
+        for name in ("2018/monaco", "2018/spain", "2019/monaco"):
+            shutil.copytree(DATA_DIR, self.root / name)
+        # compressed logs are picked up as well
+        compressed = self.root / "2019/monaco/end.log"
+        with open(compressed, "rb") as source, gzip.open(str(compressed) + ".gz", "wb") as target:
+            shutil.copyfileobj(source, target)
+        compressed.unlink()
+        (self.root / "2019/notes").mkdir()
+
+    def test_discover_races(self):
+        directories = discover_races(self.root)
+        self.assertEqual([race_name(directory, self.root) for directory in directories],
+                         ["2018-monaco", "2018-spain", "2019-monaco"])
+
+    def test_parse_race_matches_ordering(self):
+        rows = parse_race(self.root / "2018/monaco")
+        expected = ordering("asc", "")
+        self.assertEqual([row[0] for row in rows], [row["id"] for row in expected])
+        self.assertEqual(rows[0][3:], (parse_timestamp_ms(expected[0]["start_time"]),
+                                       parse_timestamp_ms(expected[0]["end_time"]), 3192460))
+
+    def test_ingest_single_process(self):
+        progress = []
+        stats = ingest(self.root, workers=1, commit_rows=25,
+                       progress=lambda done, total, name, rows: progress.append((done, total, name)))
+
+        self.assertEqual(stats["races"], 3)
+        self.assertEqual(stats["rows"], 57)
+        self.assertEqual(progress, [(1, 3, "2018-monaco"), (2, 3, "2018-spain"), (3, 3, "2019-monaco")])
+        self.assertEqual(Driver.select().count(), 57)
+        spain = Race.get(Race.name == "2018-spain")
+        self.assertEqual(spain.title, "2018 Spain")
+        fastest = Driver.select().where(Driver.race == spain).order_by(Driver.delta_time).first()
+        self.assertEqual((fastest.id, fastest.delta_time), ("LHM", "0:53:12.460000"))
+        # 19 drivers per race: the writer commits after the second race and once more at the end
+        self.assertEqual(DatasetVersion.get().version, 2)
+
+    def test_ingest_process_pool(self):
+        stats = ingest(self.root, workers=2)
+
+        self.assertEqual(stats["races"], 3)
+        self.assertEqual(Driver.select().count(), 57)
+        self.assertEqual(DatasetVersion.get().version, 1)
+
+    def test_ingest_is_idempotent(self):
+        ingest(self.root, workers=1)
+        ingest(self.root, workers=1)
+
+        self.assertEqual(Race.select().count(), 3)
+        self.assertEqual(Driver.select().count(), 57)
+
+    def test_unchanged_races_are_skipped(self):
+        ingest(self.root, workers=1)
+        version = DatasetVersion.get().version
+        with open(self.root / "2018/spain/abbreviations.txt", "a") as stream:
+            stream.write("\nXXX_Extra Driver_NO TEAM")
+
+        progress = []
+        stats = ingest(self.root, workers=1,
+                       progress=lambda done, total, name, rows: progress.append((done, total, name)))
+
+        self.assertEqual((stats["races"], stats["skipped"]), (1, 2))
+        self.assertEqual(progress, [(1, 1, "2018-spain")])
+        self.assertEqual(DatasetVersion.get().version, version + 1)
+        self.assertEqual(ingest(self.root, workers=1)["skipped"], 3)
+        self.assertEqual(DatasetVersion.get().version, version + 1)
+
+    def test_changed_race_drops_vanished_drivers(self):
+        ingest(self.root, workers=1)
+        abbreviations = self.root / "2018/spain/abbreviations.txt"
+        lines = abbreviations.read_text().splitlines()
+        abbreviations.write_text("\n".join(line for line in lines if not line.startswith("SVF")))
+
+        stats = ingest(self.root, workers=1)
+        spain = Race.get(Race.name == "2018-spain")
+        monaco = Race.get(Race.name == "2018-monaco")
+
+        self.assertEqual((stats["races"], stats["rows"]), (1, 18))
+        self.assertEqual(spain.results.count(), 18)
+        self.assertIsNone(Driver.get_or_none((Driver.race == spain) & (Driver.id == "SVF")))
+        self.assertEqual(monaco.results.count(), 19)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+from myapp.report import *
+from myapp.logcache import LogCache, RACY_SECONDS, CODE_VERSION, code_version
+import myapp.logcache
+import compileall
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+DATA_DIR = BASE_DIR / 'data'
+
+
+class TestLogCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.logs = pathlib.Path(self.tmp.name) / "logs"
+        shutil.copytree(DATA_DIR, self.logs)
+        self.paths = [self.logs / name for name in ("start.log", "end.log", "abbreviations.txt")]
+        self.age(self.paths)
+        self.cache_dir = pathlib.Path(self.tmp.name) / "cache"
+        self.joins = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def age(self, paths, seconds=RACY_SECONDS * 10):
+        then = time.time() - seconds
+        for path in paths:
+            os.utime(path, (then, then))
+
+    def join(self, *paths):
+        self.joins.append(paths)
+        return join_logs(*paths)
+
+    def results(self, cache, order, driver_id):
+        return list(cache.load(self.paths, self.join).iter_results(order, driver_id))
+
+    def test_matches_uncached_join(self):
+        cache = LogCache(self.cache_dir)
+        report = join_logs(*self.paths)
+        expected = {
+            "asc": report,
+            "desc": sorted(report, key=lambda result: result.delta_time, reverse=True),
+        }
+        for order, rows in expected.items():
+            with self.subTest(order=order):
+                self.assertEqual(self.results(cache, order, ""), list(iter_drivers_statistic(rows)))
+        self.assertEqual(self.results(cache, "asc", "SVF"),
+                         list(iter_drivers_statistic([row for row in report if row.abbreviation == "SVF"])))
+        self.assertEqual(self.results(cache, "asc", "XXX"), [])
+        self.assertEqual(len(self.joins), 1)
+
+    def test_results_survive_the_process(self):
+        expected = self.results(LogCache(self.cache_dir), "desc", "")
+        self.assertEqual(len(list(self.cache_dir.glob("*.bin"))), 1)
+
+        # a new process, and logs that were touched without changing
+        self.age(self.paths, RACY_SECONDS * 5)
+        self.assertEqual(self.results(LogCache(self.cache_dir), "desc", ""), expected)
+        self.assertEqual(len(self.joins), 1)
+
+    def test_changed_logs_are_joined_again(self):
+        cache = LogCache(self.cache_dir)
+        before = self.results(cache, "asc", "")
+        with open(self.paths[2], "a") as stream:
+            stream.write("\nXXX_Extra Driver_NO TEAM")
+        # rewrites within the same mtime tick are caught too, by hashing fresh files
+        after = self.results(cache, "asc", "")
+
+        self.assertEqual(len(self.joins), 2)
+        self.assertEqual(after, before)
+
+        with open(self.paths[0], "a") as stream:
+            stream.write("\nXXX2018-05-24_12:30:00.000")
+        with open(self.paths[1], "a") as stream:
+            stream.write("\nXXX2018-05-24_1:20:00.000")
+        self.assertEqual(self.results(cache, "asc", "")[0]["id"], "XXX")
+        self.assertEqual(len(self.joins), 3)
+
+    def test_other_code_version_is_not_reused(self):
+        self.results(LogCache(self.cache_dir), "asc", "")
+        with mock.patch("myapp.logcache.CODE_VERSION", "changed"):
+            self.results(LogCache(self.cache_dir), "asc", "")
+        self.assertEqual(len(self.joins), 2)
+        self.assertEqual(len(list(self.cache_dir.glob("*.bin"))), 2)
+
+    def test_code_version_follows_the_sources(self):
+        self.assertEqual(code_version(), CODE_VERSION)
+        self.assertNotEqual(code_version(("myapp.report",)), code_version(("myapp.board",)))
+
+    def test_code_version_without_sources(self):
+        # a .pyc-only install: the modules are still imported and keyed, from their bytecode
+        with tempfile.TemporaryDirectory() as tmp:
+            package = pathlib.Path(tmp) / "myapp"
+            shutil.copytree(pathlib.Path(myapp.logcache.__file__).parent, package,
+                            ignore=shutil.ignore_patterns("__pycache__"))
+            compileall.compile_dir(package, legacy=True, quiet=1)
+            for source in package.glob("*.py"):
+                source.unlink()
+            result = subprocess.run([sys.executable, "-c", "import myapp.report, myapp.logcache; "
+                                     "print(myapp.logcache.CODE_VERSION)"],
+                                    env=dict(os.environ, PYTHONPATH=tmp), cwd=tmp, capture_output=True, text=True)
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertNotIn(result.stdout.strip(), ("", CODE_VERSION))
+
+    def test_ordering_uses_the_cache(self):
+        self.assertEqual(ordering("asc", "", *self.paths), ordering("asc", ""))
+        self.assertEqual(ordering("desc", "", *self.paths), ordering("desc", ""))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+from myapp import *
+from myapp.metrics import Histogram, Counter, Registry, RequestMetrics, registry
+import re
+import unittest
+from unittest import mock
+from support import DatabaseTestCase
+
+
+def sample(text, name, **labels):
+    for line in text.splitlines():
+        match = re.match(r"(\w+)(?:\{(.*)\})? (\S+)$", line)
+        if match is None or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2) or ""))
+        if all(found.get(key) == value for key, value in labels.items()):
+            return float(match.group(3))
+    return 0.0
+
+
+class TestExposition(unittest.TestCase):
+    def test_histogram(self):
+        local = Registry()
+        histogram = local.register(Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0)))
+        histogram.observe(0.05, "a")
+        histogram.observe(0.1, "a")
+        histogram.observe(3, "a")
+        text = local.render()
+
+        with self.subTest():
+            self.assertIn("# TYPE demo_seconds histogram", text)
+            self.assertIn('demo_seconds_bucket{route="a",le="0.1"} 2', text)
+            self.assertIn('demo_seconds_bucket{route="a",le="1"} 2', text)
+            self.assertIn('demo_seconds_bucket{route="a",le="+Inf"} 3', text)
+            self.assertIn('demo_seconds_count{route="a"} 3', text)
+            self.assertEqual(sample(text, "demo_seconds_sum", route="a"), 3.15)
+
+    def test_counter_escapes_labels(self):
+        local = Registry()
+        counter = local.register(Counter("demo_total", "Demo.", ("path",)))
+        counter.inc('a"b\\c')
+        counter.inc('a"b\\c', amount=2)
+
+        self.assertIn('demo_total{path="a\\"b\\\\c"} 3', local.render())
+
+    def test_phases_do_not_overlap(self):
+        request_metrics = RequestMetrics()
+        request_metrics.enter("render")
+        request_metrics.add_query(0.25)
+        request_metrics.exit()
+
+        self.assertEqual(request_metrics.phases["query"], 0.25)
+        self.assertLess(request_metrics.phases["render"], 0)
+        self.assertEqual(request_metrics.queries, 1)
+
+
+class TestRequestMetrics(DatabaseTestCase):
+    MODELS = (BaseModel, Driver, DatasetVersion)
+
+    def setUp(self):
+        super().setUp()
+        self.test_db.query_hooks.append(record_query)
+        bulk_insert_into_driver_table([
+            {'id': 'LHM', 'name': 'Lewis Hamilton', 'car': 'MERCEDES', 'start_time': '12:18:20.125',
+             'end_time': '1:11:32.585', 'delta_time': '0:53:12.460000'},
+            {'id': 'SSW', 'name': 'Sergey Sirotkin', 'car': 'WILLIAMS MERCEDES', 'start_time': '12:16:11.648',
+             'end_time': '1:11:24.354', 'delta_time': '0:55:12.706000'}
+        ])
+
+    def test_phases_queries_and_cache(self):
+        before = registry.render()
+        self.client.get("/api/v1.0/report/standings", query_string={"format": "json"})
+        self.client.get("/api/v1.0/report/standings", query_string={"format": "json"})
+        self.client.get("/report")
+        after = self.client.get("/metrics")
+        text = after.get_data(as_text=True)
+
+        def delta(name, **labels):
+            return sample(text, name, **labels) - sample(before, name, **labels)
+
+        with self.subTest():
+            self.assertTrue(after.content_type.startswith("text/plain; version=0.0.4"))
+            self.assertEqual(delta("report_request_duration_seconds_count", route="standings", status="200"), 2)
+            for name in ("connect", "query", "close"):
+                self.assertEqual(delta("report_request_phase_seconds_count", route="standings", phase=name), 2)
+            self.assertEqual(delta("report_request_phase_seconds_count", route="standings", phase="serialize"), 1)
+            self.assertEqual(delta("report_request_phase_seconds_count", route="report_form", phase="render"), 1)
+            self.assertEqual(delta("report_request_queries_count", route="standings"), 2)
+            self.assertGreater(delta("report_request_queries_sum", route="standings"), 2)
+            self.assertEqual(delta("report_cache_lookups_total", result="miss"), 2)
+            self.assertEqual(delta("report_cache_lookups_total", result="hit"), 1)
+
+    def test_unread_streamed_body_recorded(self):
+        before = registry.render()
+        self.client.head("/api/v1.0/report", query_string={"format": "xml"}).close()
+        text = registry.render()
+
+        self.assertEqual(sample(text, "report_request_duration_seconds_count", route="commonstatistic", status="200") -
+                         sample(before, "report_request_duration_seconds_count", route="commonstatistic",
+                                status="200"), 1)
+
+    def test_slow_request_logged(self):
+        with mock.patch("myapp.metrics.SLOW_REQUEST_SECONDS", 0), self.assertLogs("myapp.metrics", "WARNING") as logs:
+            # a streamed request is done once the server closes its body
+            self.client.get("/api/v1.0/report", query_string={"format": "xml"}).close()
+
+        self.assertRegex(logs.output[0], r"slow request commonstatistic took .* with \d+ queries: .*serialize=")
+
+    def test_disabled(self):
+        before = registry.render()
+        with mock.patch("myapp.metrics.ENABLED", False):
+            response = self.client.get("/api/v1.0/report", query_string={"format": "json"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(registry.render(), before)
@@ -0,0 +1,151 @@
+from myapp.report import *
+import bz2
+import datetime
+import gzip
+import io
+import pathlib
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TestJoin(unittest.TestCase):
+    def setUp(self):
+        self.starts = [["LHM", "2018-05-24", "12:18:20.125"], ["SSW", "2018-05-24", "12:16:11.648"],
+                       ["EOF", "2018-05-24", "12:17:58.810"], ["LHM", "2018-05-24", "12:18:21.000"],
+                       ["KRF", "2018-05-24", "12:03:01.250"]]
+        self.finishes = [["SSW", "2018-05-24", "1:11:24.354"], ["EOF", "2018-05-24", "1:12:11.838"],
+                         ["LHM", "2018-05-24", "1:11:32.585"], ["MES", "2018-05-24", "1:05:58.778"]]
+        self.racers = [["LHM", "Lewis Hamilton", "MERCEDES"], ["SSW", "Sergey Sirotkin", "WILLIAMS MERCEDES"],
+                       ["SSW", "Sergey Sirotkin", "WILLIAMS MERCEDES"], ["CLS", "Charles Leclerc", "SAUBER FERRARI"]]
+
+    def test_count_time(self):
+        delta_times = count_time(self.starts, self.finishes)
+
+        self.assertEqual(delta_times[0], ("LHM", "12:18:20.125", "1:11:32.585",
+                                          datetime.timedelta(minutes=53, seconds=12, milliseconds=460)))
+        self.assertEqual([line[0] for line in delta_times], ["LHM", "SSW", "EOF"])
+
+    def test_built_report_reports_issues(self):
+        issues = new_join_issues()
+        delta_times = count_time(self.starts, self.finishes, issues)
+        report = built_report(delta_times, self.racers, "desc", "", issues)
+
+        self.assertEqual([racer[0] for racer in report], ["SSW", "LHM"])
+        self.assertEqual(issues["duplicate_start"], ["LHM"])
+        self.assertEqual(issues["duplicate_abbreviation"], ["SSW"])
+        self.assertEqual(issues["no_finish"], ["KRF"])
+        self.assertEqual(issues["no_start"], ["MES"])
+        self.assertEqual(issues["no_time"], ["CLS"])
+        self.assertEqual(issues["no_abbreviation"], ["EOF"])
+
+    def test_report_records(self):
+        lines = ["LHM_Lewis Hamilton_MERCEDES", "VBM_Valtteri Bottas_MERCEDES"]
+        racers = list(iter_abbreviations(iter_lines(io.StringIO("\n".join(lines)))))
+        report = built_report(count_time(self.starts, self.finishes), racers, "asc", "")
+
+        self.assertEqual(report, [("LHM", "Lewis Hamilton", "MERCEDES", "12:18:20.125", "1:11:32.585",
+                                   datetime.timedelta(minutes=53, seconds=12, milliseconds=460))])
+        self.assertEqual(report[0].delta_time, report[0][5])
+        self.assertIs(racers[0].car, racers[1].car)
+        with self.assertRaises(AttributeError):
+            report[0].car = "FERRARI"
+
+    def test_ordering(self):
+        report = ordering(order="asc", driver_id="")
+
+        self.assertEqual(len(report), 19)
+        self.assertEqual(report[0]["id"], "LHM")
+        self.assertEqual(ordering(order="asc", driver_id="SVF")[0]["name"], "Sebastian Vettel")
+
+
+class TestStreamingParser(unittest.TestCase):
+    LINES = "SVF2018-05-24_12:02:58.917\r\nNHR2018-05-24_12:02:49.914\r\n\r\nFAM2018-05-24_12:13:04.512"
+
+    def test_iter_time_records_from_file_like(self):
+        records = iter_time_records(iter_lines(io.StringIO(self.LINES)))
+
+        self.assertEqual(next(records), ("SVF", "2018-05-24", "12:02:58.917"))
+        self.assertEqual(len(list(records)), 2)
+        self.assertEqual(list(iter_lines(io.BytesIO(self.LINES.encode()))),
+                         ["SVF2018-05-24_12:02:58.917", "NHR2018-05-24_12:02:49.914", "FAM2018-05-24_12:13:04.512"])
+
+    def test_ordering_from_file_objects(self):
+        files = [io.StringIO(path.read_text(encoding="utf-8"))
+                 for path in (START_DATA_FILE, FINISH_DATA_FILE, ABBREVIATIONS_FILE)]
+        self.assertEqual(ordering("desc", "", *files), ordering("desc", ""))
+
+        files = [io.BytesIO(path.read_bytes()) for path in (START_DATA_FILE, FINISH_DATA_FILE, ABBREVIATIONS_FILE)]
+        self.assertEqual(ordering("asc", "SVF", *files), ordering("asc", "SVF"))
+
+    def test_compressed_logs(self):
+        expected = read_data_from_file(START_DATA_FILE)
+        with tempfile.TemporaryDirectory() as tmp:
+            for suffix, module in ((".gz", gzip), (".bz2", bz2)):
+                path = pathlib.Path(tmp) / ("start.log" + suffix)
+                with module.open(path, "wt", encoding="utf-8") as f:
+                    f.write("\n".join(expected))
+
+                with self.subTest(suffix=suffix):
+                    self.assertEqual(list(iter_lines(path)), expected)
+
+    def test_ordering_from_compressed_logs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            files = []
+            for source in (START_DATA_FILE, FINISH_DATA_FILE, ABBREVIATIONS_FILE):
+                path = pathlib.Path(tmp) / (source.name + ".gz")
+                with gzip.open(path, "wt", encoding="utf-8") as f:
+                    f.write(source.read_text(encoding="utf-8"))
+                files.append(path)
+
+            self.assertEqual(ordering("desc", "", *files), ordering("desc", ""))
+
+
+class TestTimestamps(unittest.TestCase):
+    def strptime_ms(self, value):
+        parsed = datetime.datetime.strptime(value, "%I:%M:%S.%f")
+        return ((parsed.hour * 60 + parsed.minute) * 60 + parsed.second) * 1000 + parsed.microsecond // 1000
+
+    def full_range(self):
+        for hour in range(1, 13):
+            for minute in range(60):
+                for second in (0, 1, 29, 59):
+                    yield "{}:{:02d}:{:02d}.{:03d}".format(hour, minute, second, (minute * 17 + second) % 1000)
+                    yield "{:02d}:{:02d}:{:02d}.999".format(hour, minute, second)
+
+    def test_parse_timestamp_ms_matches_strptime(self):
+        for value in self.full_range():
+            self.assertEqual(parse_timestamp_ms(value), self.strptime_ms(value), value)
+
+    def test_wraparound(self):
+        self.assertEqual(parse_timestamp_ms("12:00:00.000"), 0)
+        self.assertEqual(parse_timestamp_ms("1:05:58.778") - parse_timestamp_ms("12:04:45.513"),
+                         (61 * 60 + 13) * 1000 + 265)
+
+    def test_parse_timestamp_ms_rejects_bad_values(self):
+        for value in ("13:00:00.000", "0:10:00.000", "1:60:00.000", "1:00:60.000", "1:00:00", "1:0a:00.000"):
+            with self.subTest(value=value):
+                self.assertRaises(ValueError, parse_timestamp_ms, value)
+
+    def test_format_round_trip(self):
+        for value in self.full_range():
+            self.assertEqual(parse_timestamp_ms(format_timestamp_ms(parse_timestamp_ms(value))),
+                             parse_timestamp_ms(value))
+        for delta in ("0:53:12.460000", "10:00:00", "1 day, 2:03:04.005000", "-1 day, 23:59:59.999000"):
+            self.assertEqual(format_delta_ms(parse_delta_ms(delta)), delta)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_parse_timestamps_ms_batch(self):
+        values = list(self.full_range())
+
+        self.assertEqual(parse_timestamps_ms(values).tolist(), [self.strptime_ms(value) for value in values])
+        self.assertRaises(ValueError, parse_timestamps_ms, ["1:05:58.778", "13:05:58.778"])
+        self.assertRaises(ValueError, parse_timestamps_ms, ["1:05-58.778"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+from myapp.serializers import *
+import json
+import unittest
+
+try:
+    from dicttoxml import dicttoxml
+except ImportError:
+    dicttoxml = None
+
+
+class TestSerializers(unittest.TestCase):
+    def setUp(self):
+        self.report = {"total": 1, "title": "Monaco Racing 2018 Drivers",
+                       "drivers": [{"id": "KRF", "name": "Kimi Räikkönen"}]}
+
+    def test_dumps_json_stdlib(self):
+        self.assertEqual(dumps_json(self.report, backend="json"), (json.dumps(self.report) + "\n").encode())
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_dumps_json_orjson(self):
+        body = dumps_json(self.report, backend="orjson")
+
+        self.assertTrue(body.endswith(b"\n"))
+        self.assertEqual(json.loads(body), self.report)
+
+    @unittest.skipIf(dicttoxml is None, "dicttoxml is not installed")
+    def test_dumps_xml_matches_dicttoxml(self):
+        reports = [
+            self.report,
+            {"total": 0, "title": "Monaco Racing 2018", "drivers": []},
+            {"total": 2, "title": "Monaco & <Racing> \"2018\" 'Drivers'",
+             "drivers": [{"id": "LHM", "name": "Lewis Hamilton", "car": "MERCEDES", "start_time": "12:18:20.125",
+                          "end_time": "1:11:32.585", "delta_time": "0:53:12.460000"},
+                         {"id": "A&B", "name": None, "car": True, "start_time": 1, "end_time": 1.5,
+                          "delta_time": ""}]},
+            None,
+        ]
+        for report in reports:
+            with self.subTest(report=report):
+                expected = dicttoxml(report, attr_type=False, custom_root="full_report", item_func=lambda x: "driver")
+                self.assertEqual(dumps_xml(report), expected)
+
+    def test_iter_xml_streams_rows(self):
+        rows = ({"id": "D{:04d}".format(i), "name": "Driver"} for i in range(1000))
+        chunks = list(iter_xml({"total": 1000, "title": "Monaco Racing 2018", "drivers": rows}))
+
+        self.assertGreater(len(chunks), 3)
+        self.assertTrue(chunks[0].startswith(b'<?xml version="1.0" encoding="UTF-8" ?><full_report><total>1000'))
+        self.assertTrue(b"".join(chunks).endswith(b"</driver></drivers></full_report>"))
+
+
+if __name__ == "__main__":
+    unittest.main()
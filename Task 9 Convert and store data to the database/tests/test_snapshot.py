@@ -0,0 +1,148 @@
+from myapp import *
+import myapp.snapshot as snapshot
+from myapp.snapshot import Snapshot, encode_snapshot, publish_snapshot, current_snapshot
+import threading
+import unittest
+from unittest import mock
+from playhouse.test_utils import count_queries
+from support import DatabaseTestCase
+
+
+class TestSnapshot(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        Race.create(id=DEFAULT_RACE_ID, name=DEFAULT_RACE_NAME, title=DEFAULT_RACE_TITLE)
+        insert_into_driver_table()
+
+    def test_orderings_positions_and_lookup(self):
+        board = Snapshot(encode_snapshot()).board(DEFAULT_RACE_ID)
+        expected = [row["id"] for row in ordering("asc", "")]
+
+        with self.subTest():
+            self.assertEqual(len(board), 19)
+            self.assertEqual([row["id"] for row in board.rows(("id",))], expected)
+            self.assertEqual([row["id"] for row in board.rows(("id",), "desc")], expected[::-1])
+            self.assertEqual([row["place"] for row in board.rows(("place",))], list(range(1, 20)))
+            self.assertEqual(board.get("SVF", ("name", "place")), {"name": "Sebastian Vettel",
+                                                                 "place": expected.index("SVF") + 1})
+            self.assertIsNone(board.get("XXX"))
+
+    def test_pages_match_database(self):
+        board = Snapshot(encode_snapshot()).board(DEFAULT_RACE_ID)
+        for order in ("asc", "desc"):
+            drivers, next_cursor = board.page(("id",), order, limit=5)
+            lap_ms, _, driver_id = next_cursor.partition(":")
+            second, _ = board.page(("id",), order, limit=5, after=(int(lap_ms), driver_id))
+            with self.subTest(order=order):
+                query = select_drivers((Driver.id,), order).limit(10)
+                self.assertEqual([row["id"] for row in drivers + second], [driver.id for driver in query])
+
+    def test_api_reads_no_tables(self):
+        self.client.get("/api/v1.0/report", query_string={"format": "json"})
+        response_cache.clear()
+        with count_queries() as counter:
+            report = self.client.get("/api/v1.0/report", query_string={"format": "json"})
+            driver = self.client.get("/api/v1.0/report/drivers/driver", query_string={"driver_id": "SVF",
+                                                                                     "format": "json"})
+
+        with self.subTest():
+            self.assertEqual(counter.count, 2)
+            self.assertEqual(report.json["total"], 19)
+            self.assertEqual(report.json["drivers"][0]["delta_time"], "0:53:12.460000")
+            self.assertEqual(driver.json["drivers"][0]["end_time"], "1:04:03.332")
+
+    def test_driver_lookup_without_id(self):
+        self.assertIsNotNone(current_snapshot())
+        response = self.client.get("/api/v1.0/report/drivers/driver", query_string={"format": "json"})
+        unknown = self.client.get("/api/v1.0/report/drivers/driver", query_string={"driver_id": "XXX",
+                                                                                  "format": "json"})
+
+        with self.subTest():
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.json["total"], response.json["drivers"]), (0, []))
+            self.assertEqual((unknown.json["total"], unknown.json["drivers"]), (0, []))
+
+    def test_ties_share_a_place(self):
+        bulk_insert_into_driver_table([
+            {'id': 'TIE', 'name': 'Tied Driver', 'car': 'NEW', 'start_time': '12:00:00.000',
+             'end_time': '12:53:12.460', 'delta_time': '0:53:12.460000'}])
+        places = {}
+        for path in ("snapshot", "query"):
+            response_cache.clear()
+            snapshot = current_snapshot() if path == "snapshot" else None
+            with mock.patch("myapp.app.current_snapshot", return_value=snapshot):
+                response = self.client.get("/report/", query_string={"order": "asc"})
+            places[path] = response.data.count(b"<td>1</td>"), response.data.count(b"<td>2</td>"), \
+                response.data.count(b"<td>3</td>")
+        standings = self.client.get("/api/v1.0/report/standings", query_string={"format": "json"}).json
+
+        with self.subTest():
+            self.assertEqual(places["snapshot"], (2, 0, 1))
+            self.assertEqual(places["query"], places["snapshot"])
+            self.assertEqual([driver["position"] for driver in standings["drivers"][:3]], [1, 1, 3])
+
+    def test_html_shows_positions(self):
+        response = self.client.get("/report/", query_string={"order": "desc"})
+
+        self.assertIn(b"<td>19</td>", response.data)
+
+    def test_mapped_file_swapped_on_publish(self):
+        path = str(self.directory / "leaderboard.snapshot")
+        first = publish_snapshot(path)
+        with count_queries() as counter:
+            mapped = current_snapshot(path)
+            self.assertIs(current_snapshot(path), mapped)
+        self.assertEqual(counter.count, 0)
+        self.assertEqual(mapped.stamp, first.stamp)
+        self.assertEqual(len(mapped.board(DEFAULT_RACE_ID)), 19)
+
+        bulk_insert_into_driver_table([
+            {'id': 'NEW', 'name': 'New Driver', 'car': 'NEW', 'start_time': '12:00:00.000',
+             'end_time': '12:50:00.000', 'delta_time': '0:50:00'}])
+        publish_snapshot(path)
+        swapped = current_snapshot(path)
+
+        with self.subTest():
+            self.assertIsNot(swapped, mapped)
+            self.assertEqual(swapped.board(DEFAULT_RACE_ID).get("NEW", ("place",)), {"place": 1})
+            # the earlier snapshot still reads its own mapping
+            self.assertEqual(len(mapped.board(DEFAULT_RACE_ID)), 19)
+
+
+class TestSnapshotRebuild(DatabaseTestCase):
+    # the rebuild thread reads the database too
+    ON_DISK = True
+
+    def setUp(self):
+        super().setUp()
+        Race.create(id=DEFAULT_RACE_ID, name=DEFAULT_RACE_NAME, title=DEFAULT_RACE_TITLE)
+        insert_into_driver_table()
+
+    def test_new_version_is_rebuilt_off_the_request_path(self):
+        first = current_snapshot()
+        bulk_insert_into_driver_table([
+            {'id': 'NEW', 'name': 'New Driver', 'car': 'NEW', 'start_time': '12:00:00.000',
+             'end_time': '12:50:00.000', 'delta_time': '0:50:00'}])
+
+        builders = []
+
+        def encode(*args):
+            builders.append(threading.current_thread().name)
+            return encode_snapshot(*args)
+
+        with mock.patch("myapp.snapshot.encode_snapshot", encode):
+            response = self.client.get("/api/v1.0/report", query_string={"format": "json"})
+            snapshot.rebuilding.join()
+        rebuilt = current_snapshot()
+
+        with self.subTest():
+            # answered from the tables meanwhile, already with the new row
+            self.assertEqual(response.json["drivers"][0]["id"], "NEW")
+            self.assertEqual(builders, ["snapshot-rebuild"])
+            self.assertNotEqual(rebuilt.stamp, first.stamp)
+            self.assertEqual(rebuilt.stamp, get_dataset_version().stamp)
+            self.assertEqual(rebuilt.board(DEFAULT_RACE_ID).get("NEW", ("place",)), {"place": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,21 +1,11 @@
 from myapp import *
-from functools import wraps
+from myapp.cache import brotli
+import gzip
 import unittest
-
-MODELS = (BaseModel, Driver)
-
-
-def use_test_db(method):
-    @wraps(method)
-    def inner(self):
-        test_db = SqliteDatabase(':memory:')
-        with test_db.bind_ctx(MODELS):
-            test_db.create_tables(MODELS)
-            try:
-                method(self)
-            finally:
-                test_db.drop_tables(MODELS)
-    return inner
+from unittest import mock
+from playhouse.test_utils import count_queries
+from myapp.snapshot import clear_snapshot
+from support import DatabaseTestCase, use_test_db
 
 
 class TestWeb(unittest.TestCase):
@@ -138,10 +128,102 @@ class TestWeb(unittest.TestCase):
             self.assertIn(b'1:11:32.585', response.data)
             self.assertNotIn(b'0:55:12.706000', response.data)
 
+    @use_test_db
+    def test_connection_released_on_error(self):
+        self.client.get("/report")
+        with mock.patch("myapp.app.leaderboard", side_effect=RuntimeError("query failed")):
+            with self.assertRaises(RuntimeError):
+                self.client.get("/report/drivers/?order=asc")
+
+        with self.subTest():
+            self.assertTrue(db.is_closed())
+            self.assertEqual(len(db._in_use), 0)
+
+    @use_test_db
+    def test_connection_held_until_streamed_body_is_done(self):
+        Race.create(id=DEFAULT_RACE_ID, name=DEFAULT_RACE_NAME, title=DEFAULT_RACE_TITLE)
+        insert_into_driver_table()
+        response = self.client.get("/api/v1.0/report", query_string={"format": "xml"})
+        streamed, streaming = response.is_streamed, len(db._in_use)
+        body = response.get_data()
+        response.close()
+
+        with self.subTest():
+            self.assertTrue(streamed)
+            self.assertEqual(streaming, 1)
+            self.assertIn(b"Sebastian Vettel", body)
+            self.assertTrue(db.is_closed())
+            self.assertEqual(len(db._in_use), 0)
+
+    @use_test_db
+    def test_connection_released_for_unread_streamed_body(self):
+        # HEAD closes the body without reading it, like a client gone before the first chunk
+        response_cache.clear()
+        clear_snapshot()
+        Race.create(id=DEFAULT_RACE_ID, name=DEFAULT_RACE_NAME, title=DEFAULT_RACE_TITLE)
+        insert_into_driver_table()
+        response = self.client.head("/api/v1.0/report", query_string={"format": "xml"})
+        streamed = response.is_streamed
+        response.close()
+
+        with self.subTest():
+            self.assertTrue(streamed)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(db.is_closed())
+            self.assertEqual(len(db._in_use), 0)
+
     def tearDown(self):
         self.client = None
 
 
+class TestPageCache(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        Race.create(id=DEFAULT_RACE_ID, name=DEFAULT_RACE_NAME, title=DEFAULT_RACE_TITLE)
+        insert_into_driver_table()
+
+    def test_rendered_once_per_version(self):
+        first = self.client.get("/report/", query_string={"order": "asc"})
+        with count_queries() as counter:
+            second = self.client.get("/report/", query_string={"order": "asc"})
+        desc = self.client.get("/report/", query_string={"order": "desc"})
+
+        with self.subTest():
+            self.assertEqual(counter.count, 1)
+            self.assertEqual(first.data, second.data)
+            self.assertNotEqual(first.data, desc.data)
+            self.assertIn(b"<td>1</td>", first.data)
+            self.assertEqual(second.headers["Vary"], "Accept-Encoding")
+
+    def test_gzip_variant(self):
+        plain = self.client.get("/report")
+        compressed = self.client.get("/report", headers={"Accept-Encoding": "gzip, deflate"})
+
+        with self.subTest():
+            self.assertNotIn("Content-Encoding", plain.headers)
+            self.assertEqual(compressed.headers["Content-Encoding"], "gzip")
+            self.assertEqual(gzip.decompress(compressed.data), plain.data)
+            self.assertNotEqual(compressed.headers["ETag"], plain.headers["ETag"])
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_brotli_preferred(self):
+        plain = self.client.get("/report/drivers")
+        compressed = self.client.get("/report/drivers", headers={"Accept-Encoding": "gzip, br"})
+
+        with self.subTest():
+            self.assertEqual(compressed.headers["Content-Encoding"], "br")
+            self.assertEqual(brotli.decompress(compressed.data), plain.data)
+
+    def test_keyed_on_driver(self):
+        vettel = self.client.get("/report/drivers/", query_string={"driver_id": "SVF"})
+        hamilton = self.client.get("/report/drivers/", query_string={"driver_id": "LHM"})
+
+        with self.subTest():
+            self.assertIn(b"Sebastian Vettel", vettel.data)
+            self.assertIn(b"Lewis Hamilton", hamilton.data)
+            self.assertNotIn(b"Sebastian Vettel", hamilton.data)
+
+
 if __name__ == "__main__":
     unittest.main()
 